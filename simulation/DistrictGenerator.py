@@ -0,0 +1,170 @@
+﻿import math
+import sys
+
+import yaml
+
+from DistrictModelParser import DistrictModelParser
+
+
+class DistrictGenerator:
+    YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+    METADATA = {
+        "description": "Synthetic district",
+        "latitude": 52.445212,
+        "longitude": 16.952679,
+        "elevation": 75.0,
+        "timezone": "Europe/Warsaw",
+        "ground_temperature": 8.5
+    }
+
+    STANDARDS = {
+        "ach_wind_coef": 0.1,
+        "wall_ext": {"u_value": 0.15, "heat_capacity_per_m2": 45000, "absorptance": 0.5},
+        "wall_int_load": {"u_value": 1.0, "heat_capacity_per_m2": 45000},
+        "wall_int_div": {"u_value": 2.0, "heat_capacity_per_m2": 12000},
+        "roof": {"u_value": 0.1, "heat_capacity_per_m2": 25000, "absorptance": 0.7},
+        "floor_ground": {"u_value": 0.25, "heat_capacity_per_m2": 40000, "absorptance": 0},
+        "slab_inter": {"u_value": 1.0, "heat_capacity_per_m2": 65000},
+        "window": {"u_value": 0.8, "shgc": 0.5},
+        "room": {"heat_capacity_per_m2": 10000}
+    }
+
+    ROOM_AREA = 20.0
+    ROOM_HEIGHT = 3.0
+    WALL_AREA = 15.0
+    WINDOW_AREA = 1.5
+
+    def __init__(self, n_buildings, floors, apartments_per_floor, rooms_per_apartment):
+        self.n_buildings = n_buildings
+        self.floors = floors
+        self.apartments_per_floor = apartments_per_floor
+        self.rooms_per_apartment = rooms_per_apartment
+
+    @property
+    def room_count(self):
+        return self.n_buildings * self.floors * self.apartments_per_floor * self.rooms_per_apartment
+
+    @classmethod
+    def for_room_count(cls, n_rooms, floors=4, apartments_per_floor=5, rooms_per_apartment=2):
+        rooms_per_floor = apartments_per_floor * rooms_per_apartment
+
+        if n_rooms <= floors * rooms_per_floor:
+            floors = max(1, min(floors, n_rooms // rooms_per_floor))
+            apartments_per_floor = max(1, math.ceil(n_rooms / (floors * rooms_per_apartment)))
+
+            return cls(1, floors, apartments_per_floor, rooms_per_apartment)
+
+        return cls(math.ceil(n_rooms / (floors * rooms_per_floor)), floors, apartments_per_floor, rooms_per_apartment)
+
+    def generate(self):
+        return {
+            "name": f"Synthetic district ({self.room_count} rooms)",
+            "metadata": dict(self.METADATA),
+            "templates": {
+                "apartments": {"apartment": self._generate_apartment()},
+                "buildings": {"block": self._generate_building()}
+            },
+            "buildings": [{"id": f"b{b + 1}", "template": "block"} for b in range(self.n_buildings)]
+        }
+
+    def write(self, path):
+        with open(path, "w") as f:
+            yaml.dump(self.generate(), f, Dumper=self.YAML_DUMPER, sort_keys=False)
+
+    def _generate_apartment(self):
+        return {
+            "rooms": [
+                {
+                    "id": f"room{r + 1}",
+                    "name": f"Room {r + 1}",
+                    "area": self.ROOM_AREA,
+                    "volume": self.ROOM_AREA * self.ROOM_HEIGHT,
+                    "heat_capacity_per_m2": "room"
+                }
+                for r in range(self.rooms_per_apartment)
+            ],
+            "connections": [
+                self._connection("wall", f"room{r}", f"room{r + 1}", self.WALL_AREA, "wall_int_div")
+                for r in range(1, self.rooms_per_apartment)
+            ],
+            "external_connections": [self._facade(f"room{r + 1}", r) for r in range(self.rooms_per_apartment)]
+        }
+
+    def _generate_building(self):
+        apartments = []
+        internal_connections = []
+        external_connections = []
+
+        for floor in range(self.floors):
+            for position in range(self.apartments_per_floor):
+                apartment_id = self._apartment_id(floor, position)
+
+                apartments.append({
+                    "id": apartment_id,
+                    "name": f"Apartment {floor}.{position}",
+                    "template": "apartment"
+                })
+
+                for r in range(self.rooms_per_apartment):
+                    room = f"{apartment_id}:room{r + 1}"
+
+                    if position > 0:
+                        neighbour = f"{self._apartment_id(floor, position - 1)}:room{r + 1}"
+                        internal_connections.append(
+                            self._connection("wall", neighbour, room, self.WALL_AREA, "wall_int_load"))
+
+                    if floor > 0:
+                        below = f"{self._apartment_id(floor - 1, position)}:room{r + 1}"
+                        internal_connections.append(
+                            self._connection("slab", below, room, self.ROOM_AREA, "slab_inter"))
+
+                    if position in (0, self.apartments_per_floor - 1):
+                        gable = self._connection("wall", room, "outside", self.WALL_AREA, "wall_ext")
+                        gable["azimuth"] = 270 if position == 0 else 90
+                        gable["tilt"] = 90
+                        external_connections.append(gable)
+
+                    if floor == 0:
+                        slab = self._connection("floor", room, "ground", self.ROOM_AREA, "floor_ground")
+                        slab["azimuth"] = 0
+                        slab["tilt"] = 180
+                        external_connections.append(slab)
+
+                    if floor == self.floors - 1:
+                        roof = self._connection("roof", room, "outside", self.ROOM_AREA, "roof")
+                        roof["azimuth"] = 0
+                        roof["tilt"] = 0
+                        external_connections.append(roof)
+
+        return {
+            "standards": {key: (dict(value) if isinstance(value, dict) else value)
+                          for key, value in self.STANDARDS.items()},
+            "apartments": apartments,
+            "internal_connections": internal_connections,
+            "external_connections": external_connections
+        }
+
+    def _facade(self, room, r):
+        wall = self._connection("wall", room, "outside", self.WALL_AREA, "wall_ext")
+        wall["azimuth"] = 180 if r % 2 == 0 else 0
+        wall["tilt"] = 90
+        wall["windows"] = [{"area": self.WINDOW_AREA, "thermal_code": "window"}]
+
+        return wall
+
+    @staticmethod
+    def _apartment_id(floor, position):
+        return f"apt{floor}_{position}"
+
+    @staticmethod
+    def _connection(connection_type, from_id, to_id, area, thermal_code):
+        return {"type": connection_type, "from": from_id, "to": to_id, "area": area, "thermal_code": thermal_code}
+
+
+if __name__ == "__main__":
+    generator = DistrictGenerator.for_room_count(int(sys.argv[1]))
+    generator.write(sys.argv[2])
+
+    print(f"{generator.room_count} rooms written to {sys.argv[2]}, "
+          f"{DistrictModelParser(sys.argv[2]).N} nodes parsed.")
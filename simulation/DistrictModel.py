@@ -0,0 +1,184 @@
+﻿import hashlib
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+
+from DistrictModelParser import DistrictModelParser
+from WeatherSolver import WeatherSolver
+
+
+class DistrictModel:
+    FORMAT_VERSION = 4
+
+    def __init__(self, G, G_ext_air, G_ext_ground, C, external_connections, standards, nodes, metadata,
+                 room_area=None, n_rooms=None):
+        self.G = sparse.csr_matrix(G)
+        self.G_ext_air = G_ext_air
+        self.G_ext_ground = G_ext_ground
+        self.C = C
+        self.N = len(C)
+        self.n_rooms = n_rooms if n_rooms is not None else self.N
+        self.external_connections = external_connections
+        self.standards = standards
+        self.nodes = nodes
+        self.metadata = metadata
+        self.room_area = room_area if room_area is not None else np.zeros(self.N)
+
+    @classmethod
+    def from_parser(cls, parser, standards_overrides=None):
+        G, G_ext_air, G_ext_ground, C, N, external_connections, standards, nodes = parser.parse(standards_overrides)
+
+        # Rooms come first, envelope mass nodes (if any) follow them and have no floor area.
+        room_area = np.zeros(N)
+        room_area[:parser.n_rooms] = [data["room"]["area"] for data in parser.room_data]
+
+        return cls(G, G_ext_air, G_ext_ground, C, WeatherSolver.compile_connections(external_connections),
+                   standards, nodes, parser.raw_data["metadata"], room_area, parser.n_rooms)
+
+    @classmethod
+    def from_yaml(cls, yaml_path, cache_dir=None):
+        if cache_dir is None:
+            return cls.from_parser(DistrictModelParser(yaml_path))
+
+        cache_path = os.path.join(cache_dir, f"{cls.config_hash(yaml_path)}.npz")
+
+        if os.path.exists(cache_path):
+            try:
+                return cls.load(cache_path)
+            except (OSError, KeyError, ValueError) as e:
+                print(f"Ignoring compiled model {cache_path}: {e}.")
+
+        model = cls.from_parser(DistrictModelParser(yaml_path))
+
+        os.makedirs(cache_dir, exist_ok=True)
+        model.save(cache_path)
+
+        return model
+
+    @classmethod
+    def stack(cls, models, prefixes):
+        offsets = np.cumsum([0] + [model.N for model in models])
+
+        # Keep all rooms ahead of all envelope nodes, as in a single model.
+        order = np.concatenate([np.arange(offset, offset + model.n_rooms) for model, offset in zip(models, offsets)] +
+                               [np.arange(offset + model.n_rooms, offset + model.N)
+                                for model, offset in zip(models, offsets)])
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))
+
+        nodes = {}
+        connections = []
+
+        for model, prefix, offset in zip(models, prefixes, offsets):
+            nodes.update({f"{prefix}/{node_id}": int(position[idx + offset]) for node_id, idx in model.nodes.items()})
+
+            shifted = dict(model.external_connections)
+            shifted["room_idx"] = position[shifted["room_idx"] + offset]
+            shifted["surface_idx"] = position[shifted["surface_idx"] + offset]
+            connections.append(shifted)
+
+        G = sparse.block_diag([model.G for model in models], format="csr")
+
+        return cls(
+            G[order][:, order],
+            np.concatenate([model.G_ext_air for model in models])[order],
+            np.concatenate([model.G_ext_ground for model in models])[order],
+            np.concatenate([model.C for model in models])[order],
+            {name: np.concatenate([c[name] for c in connections]) for name in connections[0]},
+            {prefix: model.standards for model, prefix in zip(models, prefixes)},
+            nodes,
+            models[0].metadata,
+            np.concatenate([model.room_area for model in models])[order],
+            sum(model.n_rooms for model in models)
+        )
+
+    def diff(self, other):
+        added = [node_id for node_id in other.nodes if node_id not in self.nodes]
+        removed = [node_id for node_id in self.nodes if node_id not in other.nodes]
+        same_nodes = self.nodes == other.nodes
+
+        connections = not same_nodes or self.standards != other.standards or \
+            self.external_connections.keys() != other.external_connections.keys() or \
+            any(not np.array_equal(values, other.external_connections[name])
+                for name, values in self.external_connections.items())
+
+        thermal = not same_nodes or self.metadata.get("ground_temperature") != other.metadata.get("ground_temperature")
+        changed = []
+
+        # With the same nodes in the same places, parameters compare index by index.
+        if same_nodes:
+            delta = abs(self.G - other.G)
+            delta.eliminate_zeros()
+
+            thermal_changed = (np.diff(delta.indptr) > 0) | (self.C != other.C) | \
+                (self.G_ext_air != other.G_ext_air) | (self.G_ext_ground != other.G_ext_ground)
+            thermal = thermal or bool(thermal_changed.any())
+
+            index_to_id = sorted(self.nodes, key=self.nodes.get)
+            changed = [index_to_id[i] for i in np.flatnonzero(thermal_changed | (self.room_area != other.room_area))]
+
+        return {
+            "added": added,
+            "removed": removed,
+            "changed": changed,
+            "nodes": not same_nodes,
+            "thermal": thermal,
+            "connections": connections,
+            "metadata": self.metadata != other.metadata
+        }
+
+    @classmethod
+    def config_hash(cls, yaml_path):
+        digest = hashlib.sha256(f"district-model-v{cls.FORMAT_VERSION}".encode())
+
+        with open(yaml_path, "rb") as f:
+            digest.update(f.read())
+
+        return digest.hexdigest()
+
+    def save(self, path):
+        node_ids = sorted(self.nodes, key=self.nodes.get)
+        arrays = {f"connection_{name}": values for name, values in self.external_connections.items()}
+
+        tmp_path = f"{path}.tmp"
+
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                format_version=self.FORMAT_VERSION,
+                G_data=self.G.data,
+                G_indices=self.G.indices,
+                G_indptr=self.G.indptr,
+                G_ext_air=self.G_ext_air,
+                G_ext_ground=self.G_ext_ground,
+                C=self.C,
+                room_area=self.room_area,
+                n_rooms=self.n_rooms,
+                node_ids=np.array(node_ids),
+                standards=json.dumps(self.standards),
+                metadata=json.dumps(self.metadata),
+                **arrays
+            )
+
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["format_version"]) != cls.FORMAT_VERSION:
+                raise ValueError(f"Unsupported compiled model version {int(data['format_version'])}.")
+
+            N = len(data["C"])
+            G = sparse.csr_matrix((data["G_data"], data["G_indices"], data["G_indptr"]), shape=(N, N))
+
+            external_connections = {
+                name[len("connection_"):]: data[name] for name in data.files if name.startswith("connection_")
+            }
+
+            nodes = {str(node_id): i for i, node_id in enumerate(data["node_ids"])}
+
+            return cls(G, data["G_ext_air"], data["G_ext_ground"], data["C"], external_connections,
+                       json.loads(str(data["standards"])), nodes, json.loads(str(data["metadata"])), data["room_area"],
+                       int(data["n_rooms"]))
@@ -1,65 +1,136 @@
-﻿import numpy as np
+﻿import copy
+
+import numpy as np
 import yaml
+from scipy import sparse
 
 
 class DistrictModelParser:
     RHO_CP_AIR = 1200
+    YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    INSTANCE_FIELDS = {"id", "name", "template", "standards"}
 
     def __init__(self, yaml_path):
         with open(yaml_path, "r") as f:
-            self.raw_data = yaml.safe_load(f)
+            self.raw_data = yaml.load(f, Loader=self.YAML_LOADER)
 
         self.nodes = {}
         self.room_data = []
-        self.external_connections = []
 
+        self._resolve_templates()
         self._build_node_index()
-        self.N = len(self.nodes)
+        self.n_rooms = len(self.nodes)
+        self.N = self.n_rooms
+
+        self._reset()
+
+        self.standards = {building["id"]: building["standards"] for building in self.buildings}
+
+    def _reset(self):
+        self.G = None
+        self._g_rows = []
+        self._g_cols = []
+        self._g_values = []
+        self._g_chunks = []
+        self._blocks = {}
+        self._envelope_ids = []
+        self.N = self.n_rooms
+        self.nodes = {node_id: idx for node_id, idx in self.nodes.items() if idx < self.n_rooms}
+
+        # Envelope mass nodes are appended after the rooms while assembling, arrays are built at the end.
+        self.G_ext_air = [0.0] * self.N
+        self.G_ext_ground = [0.0] * self.N
+        self.C = [0.0] * self.N
+        self.external_connections = []
+
+    def _resolve_templates(self):
+        templates = self.raw_data.get("templates", {})
+        apartment_templates = templates.get("apartments", {})
+        building_templates = {
+            name: self._resolve_apartments(template, apartment_templates)
+            for name, template in templates.get("buildings", {}).items()
+        }
+
+        self.buildings = []
+
+        for building in self.raw_data["buildings"]:
+            resolved = self._instantiate(building, building_templates)
+
+            if "template" not in resolved or "apartments" in building:
+                resolved = self._resolve_apartments(resolved, apartment_templates)
+
+            self.buildings.append(resolved)
+
+    def _resolve_apartments(self, building, apartment_templates):
+        apartments = [self._instantiate(apartment, apartment_templates) for apartment in building["apartments"]]
+
+        return {**building, "apartments": apartments}
+
+    def _instantiate(self, definition, templates):
+        if "template" not in definition:
+            return definition
+
+        resolved = {**templates[definition["template"]], **definition}
 
-        self.G = np.zeros((self.N, self.N))
-        self.G_ext_air = np.zeros(self.N)
-        self.G_ext_ground = np.zeros(self.N)
-        self.C = np.zeros(self.N)
+        # An instance that changes more than its identity no longer shares the template's assembled block.
+        if set(definition) - self.INSTANCE_FIELDS:
+            del resolved["template"]
 
-        self.standards = {building["id"]: building["standards"] for building in self.raw_data["buildings"]}
+        return resolved
 
     def _build_node_index(self):
         idx = 0
 
-        for building in self.raw_data["buildings"]:
+        for building in self.buildings:
             for apartment in building["apartments"]:
-                for room in apartment["rooms"]:
-                    room_id = f"{building['id']}:{apartment['id']}:{room['id']}"
+                prefix = f"{building['id']}:{apartment['id']}:"
 
-                    self.nodes[room_id] = idx
+                for room in apartment["rooms"]:
+                    self.nodes[prefix + room["id"]] = idx
                     self.room_data.append({
                         "room": room,
-                        "standards": building["standards"]
+                        "building_id": building["id"]
                     })
 
                     idx += 1
 
-    def parse(self):
-        for i, data in enumerate(self.room_data):
-            room = data["room"]
-            standards = data["standards"]
+    def parse(self, standards_overrides=None):
+        self._reset()
 
-            c_air = room["volume"] * self.RHO_CP_AIR
-            capacity_key = room["heat_capacity_per_m2"]
-            capacity_value = standards[capacity_key]["heat_capacity_per_m2"]
+        # Buildings instanced from one template share a standards object, and keep sharing it once overridden.
+        overridden = {}
+        self.standards = {}
 
-            self.C[i] = c_air + (room["area"] * capacity_value)
+        for building in self.buildings:
+            key = id(building["standards"])
 
-        for building in self.raw_data["buildings"]:
-            building_standards = building["standards"]
+            if key not in overridden:
+                overridden[key] = self.apply_overrides(building["standards"], standards_overrides)
+
+            self.standards[building["id"]] = overridden[key]
+
+        room_start = 0
+
+        for building in self.buildings:
+            standards = self.standards[building["id"]]
+            n_rooms = sum(len(apartment["rooms"]) for apartment in building["apartments"])
+
+            self._assemble_instance(self._block_key("building", building, standards), building["id"], room_start,
+                                    n_rooms, self._assemble_building, building, standards, room_start)
 
-            if "internal_connections" in building:
-                for connection in building["internal_connections"]:
-                    self._apply_internal_connection(connection, building_standards, building["id"])
+            room_start += n_rooms
 
-            if "external_connections" in building:
-                for connection in building["external_connections"]:
-                    self._apply_external_connection(connection, building_standards, building["id"])
+        self._flush_conductances()
+
+        rows = np.concatenate([chunk[0] for chunk in self._g_chunks])
+        cols = np.concatenate([chunk[1] for chunk in self._g_chunks])
+        values = np.concatenate([chunk[2] for chunk in self._g_chunks])
+
+        self.G_ext_air = np.array(self.G_ext_air)
+        self.G_ext_ground = np.array(self.G_ext_ground)
+        self.C = np.array(self.C)
+
+        self.G = sparse.coo_matrix((values, (rows, cols)), shape=(self.N, self.N)).tocsr()
 
         return (
             self.G,
@@ -72,23 +143,196 @@ class DistrictModelParser:
             self.nodes
         )
 
-    def _apply_internal_connection(self, connection, standards, building_id):
-        idx_a = self.nodes[f"{building_id}:{connection['from']}"]
-        idx_b = self.nodes[f"{building_id}:{connection['to']}"]
+    def _assemble_building(self, building, standards, room_start):
+        for apartment in building["apartments"]:
+            n_rooms = len(apartment["rooms"])
+
+            self._assemble_instance(self._block_key("apartment", apartment, standards),
+                                    f"{building['id']}:{apartment['id']}", room_start, n_rooms,
+                                    self._assemble_apartment, building["id"], apartment, standards, room_start)
+
+            room_start += n_rooms
+
+        for position, connection in enumerate(building.get("internal_connections", [])):
+            self._apply_internal_connection(connection, standards, building["id"], position)
+
+        for position, connection in enumerate(building.get("external_connections", [])):
+            self._apply_external_connection(connection, standards, building["id"], position)
+
+    def _assemble_apartment(self, building_id, apartment, standards, room_start):
+        for i, room in enumerate(apartment["rooms"], room_start):
+            c_air = room["volume"] * self.RHO_CP_AIR
+            capacity_key = room["heat_capacity_per_m2"]
+            capacity_value = standards[capacity_key]["heat_capacity_per_m2"]
+
+            self.C[i] = c_air + (room["area"] * capacity_value)
+
+        prefix = f"{building_id}:{apartment['id']}"
+
+        for position, connection in enumerate(apartment.get("connections", [])):
+            self._apply_internal_connection(connection, standards, prefix, position)
+
+        for position, connection in enumerate(apartment.get("external_connections", [])):
+            self._apply_external_connection(connection, standards, prefix, position)
+
+    @staticmethod
+    def _block_key(kind, definition, standards):
+        if "template" not in definition:
+            return None
+
+        return kind, definition["template"], id(standards)
+
+    def _assemble_instance(self, key, prefix, room_start, n_rooms, assemble, *args):
+        if key in self._blocks:
+            self._replay_block(self._blocks[key], prefix, room_start)
+            return
+
+        if key is None:
+            assemble(*args)
+            return
+
+        # The first instance of a template is assembled connection by connection and recorded as a block, the
+        # others copy that block shifted onto their own rooms and envelope nodes.
+        self._flush_conductances()
+
+        block = {
+            "prefix": prefix,
+            "room_start": room_start,
+            "n_rooms": n_rooms,
+            "envelope_start": self.N,
+            "chunk_start": len(self._g_chunks),
+            "connection_start": len(self.external_connections)
+        }
+
+        rooms = slice(room_start, room_start + n_rooms)
+        node_values = (self.C, self.G_ext_air, self.G_ext_ground)
+        before = [values[rooms] for values in node_values]
+
+        assemble(*args)
+        self._flush_conductances()
+
+        # The block's own share of its rooms' values is taken now, connections of the enclosing building are
+        # added to the same rooms later and must not be copied into other instances.
+        block["room_values"] = [np.subtract(values[rooms], start).tolist()
+                                for values, start in zip(node_values, before)]
+        block["envelope_values"] = [values[block["envelope_start"]:self.N] for values in node_values]
+        block["envelope_end"] = self.N
+        block["chunk_end"] = len(self._g_chunks)
+        block["connection_end"] = len(self.external_connections)
+
+        self._blocks[key] = block
+
+    def _replay_block(self, block, prefix, room_start):
+        room_shift = room_start - block["room_start"]
+        envelope_shift = self.N - block["envelope_start"]
+
+        def shift(idx):
+            return np.where(idx < self.n_rooms, idx + room_shift, idx + envelope_shift)
+
+        instance_rooms = slice(room_start, room_start + block["n_rooms"])
+
+        for values, room_values, envelope_values in zip((self.C, self.G_ext_air, self.G_ext_ground),
+                                                        block["room_values"], block["envelope_values"]):
+            values[instance_rooms] = np.add(values[instance_rooms], room_values).tolist()
+            values.extend(envelope_values)
+
+        for node_id in self._envelope_ids[block["envelope_start"] - self.n_rooms:block["envelope_end"] - self.n_rooms]:
+            instance_id = prefix + node_id[len(block["prefix"]):]
+
+            self.nodes[instance_id] = self.N
+            self._envelope_ids.append(instance_id)
+            self.N += 1
+
+        for rows, cols, values in self._g_chunks[block["chunk_start"]:block["chunk_end"]]:
+            self._g_chunks.append((shift(rows), shift(cols), values))
+
+        for connection in self.external_connections[block["connection_start"]:block["connection_end"]]:
+            self.external_connections.append({
+                **connection,
+                "room_idx": connection["room_idx"] + room_shift,
+                "surface_idx": int(shift(connection["surface_idx"]))
+            })
+
+    def _flush_conductances(self):
+        self._g_chunks.append((np.array(self._g_rows, dtype=np.int64), np.array(self._g_cols, dtype=np.int64),
+                               np.array(self._g_values, dtype=np.float64)))
+
+        self._g_rows = []
+        self._g_cols = []
+        self._g_values = []
+
+    @staticmethod
+    def apply_overrides(standards, overrides):
+        if not overrides:
+            return standards
+
+        standards = copy.deepcopy(standards)
+
+        for key, value in overrides.items():
+            *path, field = key.split(".")
+            target = standards
+
+            for part in path:
+                target = target[part]
+
+            if field not in target:
+                raise KeyError(f"Unknown standard: {key}.")
+
+            target[field] = value
+
+        return standards
+
+    def _add_conductance(self, idx_a, idx_b, g):
+        self._g_rows += [idx_a, idx_b]
+        self._g_cols += [idx_b, idx_a]
+        self._g_values += [g, g]
+
+    def _add_envelope_node(self, node_id, capacity):
+        idx = self.N
+
+        self.nodes[node_id] = idx
+        self._envelope_ids.append(node_id)
+        self.C.append(capacity)
+        self.G_ext_air.append(0.0)
+        self.G_ext_ground.append(0.0)
+        self.N += 1
+
+        return idx
+
+    def _add_mass_nodes(self, node_id, idx_from, ua, capacity, layers):
+        # The construction is split into equal slabs with a node in the middle of each, so the first and last links
+        # are half a slab thick and the chain keeps the construction's total conductance.
+        ua_slab = ua * layers
+        previous, g = idx_from, 2 * ua_slab
+
+        for layer in range(layers):
+            idx = self._add_envelope_node(f"{node_id}:layer{layer}", capacity / layers)
+            self._add_conductance(previous, idx, g)
+            previous, g = idx, ua_slab
+
+        return previous, 2 * ua_slab
+
+    def _apply_internal_connection(self, connection, standards, prefix, position):
+        idx_a = self.nodes[f"{prefix}:{connection['from']}"]
+        idx_b = self.nodes[f"{prefix}:{connection['to']}"]
 
         code = standards[connection["thermal_code"]]
         ua = connection["area"] * code["u_value"]
+        wall_capacity = connection["area"] * code["heat_capacity_per_m2"]
+        layers = code.get("mass_nodes", 0)
 
-        self.G[idx_a, idx_b] += ua
-        self.G[idx_b, idx_a] += ua
+        if layers:
+            idx_last, ua_last = self._add_mass_nodes(f"{prefix}:internal{position}", idx_a, ua, wall_capacity, layers)
+            self._add_conductance(idx_last, idx_b, ua_last)
+            return
 
-        wall_capacity = connection["area"] * code["heat_capacity_per_m2"]
+        self._add_conductance(idx_a, idx_b, ua)
 
         self.C[idx_a] += wall_capacity * 0.5
         self.C[idx_b] += wall_capacity * 0.5
 
-    def _apply_external_connection(self, connection, standards, building_id):
-        idx_a = self.nodes[f"{building_id}:{connection['from']}"]
+    def _apply_external_connection(self, connection, standards, prefix, position):
+        idx_a = self.nodes[f"{prefix}:{connection['from']}"]
         target = connection["to"]
         thermal_code = standards[connection["thermal_code"]]
 
@@ -105,30 +349,43 @@ class DistrictModelParser:
                 "shgc": window_standard["shgc"]
             })
 
+        wall_net_area = connection["area"] - windows_area_sum
+        ua_wall = wall_net_area * thermal_code["u_value"]
+
+        ua_windows = sum(
+            window["area"] * standards[window["thermal_code"]]["u_value"] for window in connection.get("windows", []))
+
+        wall_capacity = wall_net_area * thermal_code["heat_capacity_per_m2"]
+        layers = thermal_code.get("mass_nodes", 0) if wall_net_area > 0 else 0
+
+        # Solar gains on the opaque part land on the outer wall node, which is the room itself for a lumped wall.
+        if layers:
+            idx_surface, ua_surface = self._add_mass_nodes(f"{prefix}:external{position}", idx_a, ua_wall,
+                                                           wall_capacity, layers)
+            u_surface = ua_surface / wall_net_area
+            ua_room = ua_windows
+        else:
+            idx_surface, ua_surface = idx_a, 0.0
+            u_surface = thermal_code["u_value"]
+            ua_room = ua_wall + ua_windows
+
+            self.C[idx_a] += wall_capacity
+
         if target != "ground":
             self.external_connections.append({
                 "room_idx": idx_a,
+                "surface_idx": idx_surface,
                 "azimuth": connection["azimuth"],
                 "tilt": connection["tilt"],
                 "area_gross": connection["area"],
                 "windows": windows_to_solve,
                 "volume": self.room_data[idx_a]["room"]["volume"],
                 "ach_wind_coef": standards["ach_wind_coef"],
-                "u_value": thermal_code["u_value"],
+                "u_value": u_surface,
                 "absorptance": thermal_code["absorptance"]
             })
 
-        wall_net_area = connection["area"] - windows_area_sum
-        ua_wall = wall_net_area * thermal_code["u_value"]
-
-        ua_windows = sum(
-            window["area"] * standards[window["thermal_code"]]["u_value"] for window in connection.get("windows", []))
-
-        ua_total = ua_wall + ua_windows
-
-        if target == "ground":
-            self.G_ext_ground[idx_a] += ua_total
-        else:
-            self.G_ext_air[idx_a] += ua_total
+        G_ext = self.G_ext_ground if target == "ground" else self.G_ext_air
 
-        self.C[idx_a] += wall_net_area * thermal_code["heat_capacity_per_m2"]
+        G_ext[idx_a] += ua_room
+        G_ext[idx_surface] += ua_surface
@@ -1,56 +1,192 @@
-﻿from datetime import timedelta
+﻿import hashlib
+import io
+import os
+from datetime import timedelta
 
+import numpy as np
 import pandas as pd
 
-from DistrictModelParser import DistrictModelParser
+from DistrictModel import DistrictModel
+from HvacSystem import HvacSystem
+from PartitionedSolver import PartitionedSolver
+from ReducedModel import ReducedModel
+from SimulationMetrics import SimulationMetrics
+from StepKernel import StepKernel
 from ThermalSolver import ThermalSolver
 from WeatherService import WeatherService
 from WeatherSolver import WeatherSolver
 
 
 class DistrictSimulation:
-    def __init__(self, config_path, weather_path):
-        parser = DistrictModelParser(config_path)
-        self.metadata = parser.raw_data["metadata"]
-        G, G_ext_air, G_ext_ground, C, N, external_connections, standards, nodes = parser.parse()
+    CHECKPOINT_VERSION = 2
+    CHECKPOINT_EXTENSION = ".npz"
+
+    def __init__(self, config_path, weather_path, method="euler", dt_seconds=None, model_cache_dir=None,
+                 metrics=None, workers=None, hvac=None, checkpoint_interval=None, checkpoint_dir=None,
+                 steady_state=False, kernel="auto", reduced_order=None):
+        self.metrics = metrics if metrics is not None else SimulationMetrics(enabled=False)
+
+        self.config_path = config_path
+        self.model_cache_dir = model_cache_dir
+        self.model = DistrictModel.from_yaml(config_path, model_cache_dir)
+        self.metadata = self.model.metadata
 
         self.thermal_solver = ThermalSolver(
-            G=G,
-            C=C,
-            G_ext_air=G_ext_air,
-            G_ext_ground=G_ext_ground,
-            T_ground=self.metadata["ground_temperature"]
+            G=self.model.G,
+            C=self.model.C,
+            G_ext_air=self.model.G_ext_air,
+            G_ext_ground=self.model.G_ext_ground,
+            T_ground=self.metadata["ground_temperature"],
+            method=method
         )
 
-        self.weather_solver = WeatherSolver(external_connections, standards, N)
+        self.weather_solver = WeatherSolver(self.model.external_connections, self.model.standards, self.model.N)
+
+        self._hvac_from_model = hvac is True
+        if hvac is True:
+            hvac = HvacSystem.from_model(self.model)
+        self.hvac = hvac or None
+
+        self.partitioned_solver = None
+        if workers is not None and workers > 1:
+            if self.hvac is not None:
+                raise ValueError("The HVAC layer is not supported with partitioned stepping.")
+
+            if reduced_order is not None:
+                raise ValueError("The reduced model is not supported with partitioned stepping.")
+
+            self.partitioned_solver = PartitionedSolver(self.model, self.metadata["ground_temperature"], method,
+                                                        workers)
+            self.thermal_solver.T = self.partitioned_solver.T
+
+        # A k-state surrogate stands in for the thermal solver, it takes the weather gains as modal inputs and the
+        # full temperatures are only reconstructed for output, checkpoints and the HVAC layer.
+        self.reduced_model = None
+        self.step_solver = self.thermal_solver
+        if reduced_order is not None:
+            self.reduced_model = ReducedModel(self.thermal_solver, reduced_order, weather_solver=self.weather_solver)
+            self.step_solver = self.reduced_model
+
+        self.kernel_backend = kernel
+        self.kernel = None
+        if kernel is not None and self.partitioned_solver is None and self.reduced_model is None:
+            self.kernel = StepKernel(self.thermal_solver, self.weather_solver, kernel, self.metrics.clock)
+
+        self.start_time = pd.Timestamp("2024-01-01 00:00:00").tz_localize(self.metadata["timezone"])
+        self.end_time = pd.Timestamp("2025-01-01 00:00:00").tz_localize(self.metadata["timezone"])
+        self.current_time = self.start_time
+        self.step_index = None
 
-        self.current_time = pd.Timestamp("2024-01-01 00:00:00").tz_localize(self.metadata["timezone"])
         self.weather_service = WeatherService(weather_path, self.metadata["timezone"], self.metadata["latitude"],
                                               self.metadata["longitude"])
 
-        self.index_to_id = {v: k for k, v in nodes.items()}
+        self.orientation_table = None
+
+        if dt_seconds is not None:
+            self.weather_service.precompute(self.start_time, self.end_time, dt_seconds)
+            self.step_index = 0
+            self._build_orientation_table()
+
+        self.index_to_id = {v: k for k, v in self.model.nodes.items()}
+        self.room_ids = pd.Index([self.index_to_id[i] for i in range(self.model.n_rooms)], name="room_id")
+        self.rooms = np.s_[:self.model.n_rooms]
+        self.layout = self._node_layout(self.model)
+
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoints = {}
+
+        if checkpoint_dir is not None:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            self._index_checkpoint_dir()
+
+        if steady_state:
+            self.initialise_steady_state()
+
+    def run_step(self, dt_seconds, compact=False, weather=None):
+        clock = self.metrics.clock
 
-    def run_step(self, dt_seconds):
         try:
-            weather = self.weather_service.get_weather(self.current_time)
+            t_start = clock()
 
-            q_env = self.weather_solver.calculate_environmental_gains(
-                weather["sun_radiation"], weather["sun_altitude"], weather["sun_azimuth"],
-                weather["wind_speed"], weather["wind_direction"], weather["temperature"], self.thermal_solver.T
-            )
+            factors = {}
 
-            temperatures_array = self.thermal_solver.step(dt_seconds, weather["temperature"], q_env)
+            # Weather passed in (e.g. set by hand on the dashboard) replaces the weather history for this step.
+            if weather is None:
+                if self.step_index is not None and dt_seconds == self.weather_service.table_dt:
+                    weather = self.weather_service.get_weather_at(self.step_index)
+                    factors = {name: values[self.step_index] for name, values in self.orientation_table.items()}
+                else:
+                    weather = self.weather_service.get_weather(self.current_time)
 
-            room_temps = {
-                self.index_to_id[i]: float(temperatures_array[i])
-                for i in range(len(temperatures_array))
-            }
+            t_weather = clock()
+            gains_solve_seconds = 0.0
+
+            if self.partitioned_solver is not None:
+                t_gains = t_weather
+
+                temperatures_array = self.partitioned_solver.step(
+                    dt_seconds, weather["temperature"], weather["wind_speed"], weather["wind_direction"],
+                    weather["sun_radiation"], weather["sun_altitude"], weather["sun_azimuth"]
+                )
+            elif self.kernel is not None:
+                if self.hvac is not None:
+                    self.kernel.Q_extra[self.rooms] = self.hvac.step(self.thermal_solver.T[self.rooms],
+                                                                     weather["temperature"], dt_seconds)
+
+                t_hvac = clock()
+
+                temperatures_array = self.kernel.step(
+                    dt_seconds, weather["temperature"], weather["wind_speed"], weather["wind_direction"],
+                    weather["sun_radiation"], weather["sun_altitude"], weather["sun_azimuth"], **factors
+                )
+
+                # The kernel times its own gains pass, it follows the HVAC heat in the gains stage.
+                t_gains = t_hvac + self.kernel.gains_seconds
+                gains_solve_seconds = self.kernel.gains_solve_seconds
+            elif self.reduced_model is not None and self.hvac is None:
+                inputs = self.reduced_model.weather_inputs(
+                    weather["temperature"], weather["wind_speed"], weather["wind_direction"],
+                    weather["sun_radiation"], weather["sun_altitude"], weather["sun_azimuth"], **factors
+                )
+
+                t_gains = clock()
+
+                self.reduced_model.step_inputs(dt_seconds, inputs)
+                temperatures_array = self.reduced_model.reconstruct(rows=self.rooms)
+            else:
+                q_env = self.weather_solver.calculate_environmental_gains(
+                    weather["sun_radiation"], weather["sun_altitude"], weather["sun_azimuth"],
+                    weather["wind_speed"], weather["wind_direction"], weather["temperature"], self.thermal_solver.T,
+                    **factors
+                )
+
+                if self.hvac is not None:
+                    q_env[self.rooms] += self.hvac.step(self.thermal_solver.T[self.rooms], weather["temperature"],
+                                                        dt_seconds)
+
+                t_gains = clock()
+
+                temperatures_array = self.step_solver.step(dt_seconds, weather["temperature"], q_env)
+
+            t_solve = clock()
+
+            if compact:
+                room_temps = temperatures_array[self.rooms].copy()
+            else:
+                room_temps = {
+                    self.index_to_id[i]: float(temperatures_array[i])
+                    for i in range(len(self.room_ids))
+                }
 
             output_timestamp = self.current_time.isoformat()
-            self.current_time += timedelta(seconds=dt_seconds)
+            self._advance(dt_seconds)
+
+            if self.checkpoint_interval and self.step_index is not None and \
+                    self.step_index % self.checkpoint_interval == 0:
+                self._checkpoint(self.current_time)
 
-            if self.current_time.year >= 2025:
-                self.current_time = pd.Timestamp("2024-01-01 00:00:00").tz_localize(self.metadata["timezone"])
+            self.metrics.observe_step(t_start, t_weather, t_gains, t_solve, clock(), gains_solve_seconds)
 
             return {
                 "timestamp": output_timestamp,
@@ -58,4 +194,394 @@ class DistrictSimulation:
                 "room_temps": room_temps
             }
         except Exception as e:
-            print(e)
+            self.metrics.observe_error(e)
+            raise
+
+    def run(self, n_steps, dt_seconds):
+        clock = self.metrics.clock
+        t_start = clock()
+
+        self.ensure_weather_table(dt_seconds)
+
+        if self.step_index is None:
+            raise ValueError(f"Current time {self.current_time} is not aligned to a {dt_seconds} s step.")
+
+        table_length = self.weather_service.table_length
+        steps = (self.step_index + np.arange(n_steps)) % table_length
+        weather = {name: values[steps] for name, values in self.weather_service.table.items()}
+
+        room_temps = np.empty((n_steps, len(self.room_ids)))
+
+        t_weather = clock()
+
+        gains_seconds, gains_solve_seconds = self._integrate(weather, dt_seconds, room_temps)
+
+        t_solve = clock()
+
+        timestamps = self.weather_service.table_start + pd.to_timedelta(steps * dt_seconds, unit="s")
+        timestamps.name = "timestamp"
+
+        result = {
+            "timestamp": timestamps,
+            "weather": pd.DataFrame(weather, index=timestamps),
+            "room_temps": pd.DataFrame(room_temps, index=timestamps, columns=self.room_ids)
+        }
+
+        self.metrics.observe_batch(n_steps, t_start, t_weather, t_solve, clock(), gains_seconds, gains_solve_seconds)
+
+        return result
+
+    def fast_forward(self, n_steps, dt_seconds):
+        self.ensure_weather_table(dt_seconds)
+
+        if self.step_index is None:
+            raise ValueError(f"Current time {self.current_time} is not aligned to a {dt_seconds} s step.")
+
+        steps = (self.step_index + np.arange(n_steps)) % self.weather_service.table_length
+        self._integrate({name: values[steps] for name, values in self.weather_service.table.items()}, dt_seconds)
+
+    def seek(self, timestamp, dt_seconds):
+        timestamp = pd.Timestamp(timestamp)
+
+        # Naive timestamps are taken as local time of the district.
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize(self.metadata["timezone"])
+        else:
+            timestamp = timestamp.tz_convert(self.metadata["timezone"])
+
+        if not self.start_time <= timestamp < self.end_time:
+            raise ValueError(f"Cannot seek to {timestamp}, outside of {self.start_time} - {self.end_time}.")
+
+        target_ns = timestamp.value
+        current_ns = self.current_time.value if self.current_time.value <= target_ns else None
+        restored = False
+
+        # Resume from the closest known state before the target, the current one included. Checkpoints that do not
+        # fit the model (e.g. files from before a config reload) are dropped and the next older one is tried.
+        for checkpoint_ns in sorted((time_ns for time_ns in self.checkpoints if time_ns <= target_ns), reverse=True):
+            if current_ns is not None and checkpoint_ns <= current_ns:
+                break
+
+            try:
+                self.restore(self.checkpoints[checkpoint_ns])
+                restored = True
+                break
+            except ValueError as e:
+                print(f"Skipping checkpoint {checkpoint_ns}: {e}")
+                del self.checkpoints[checkpoint_ns]
+
+        if not restored and current_ns is None:
+            self.current_time = self.start_time
+            self.initialise_steady_state()
+
+        self.ensure_weather_table(dt_seconds)
+        self.step_index = self.weather_service.index_of(self.current_time)
+
+        n_steps, remainder = divmod((timestamp - self.current_time).total_seconds(), dt_seconds)
+
+        if remainder:
+            raise ValueError(f"Cannot reach {timestamp} from {self.current_time} in {dt_seconds} s steps.")
+
+        self.fast_forward(int(n_steps), dt_seconds)
+
+    def initialise_steady_state(self):
+        weather = self.weather_service.get_weather(self.current_time)
+
+        # Infiltration depends on room temperature, so it enters the linear system as a conductance.
+        q_env = self.weather_solver.calculate_environmental_gains(
+            weather["sun_radiation"], weather["sun_altitude"], weather["sun_azimuth"],
+            weather["wind_speed"], weather["wind_direction"], weather["temperature"], np.zeros(self.model.N)
+        )
+        g_infiltration = self.weather_solver.infiltration_conductance(weather["wind_speed"],
+                                                                      weather["wind_direction"])
+
+        T = self.thermal_solver.steady_state(weather["temperature"], q_env, g_infiltration)
+
+        if self.reduced_model is not None:
+            self.reduced_model.project()
+
+        return T
+
+    def reduced_error_bound(self):
+        if self.reduced_model is None:
+            raise ValueError("The simulation is not running a reduced model.")
+
+        return pd.Series(self.reduced_model.error_bound()[self.rooms], index=self.room_ids, name="error_bound")
+
+    def reload_config(self, config_path=None):
+        if self.partitioned_solver is not None:
+            raise ValueError("Reloading the configuration is not supported with partitioned stepping.")
+
+        config_path = config_path if config_path is not None else self.config_path
+        model = DistrictModel.from_yaml(config_path, self.model_cache_dir)
+        changes = self.model.diff(model)
+
+        for key in ("timezone", "latitude", "longitude"):
+            if model.metadata[key] != self.metadata[key]:
+                raise ValueError(f"Changing the {key} of a running simulation is not supported.")
+
+        room_ids = sorted(model.nodes, key=model.nodes.get)[:model.n_rooms]
+        rooms_changed = room_ids != list(self.room_ids) or \
+            not np.array_equal(model.room_area[:model.n_rooms], self.model.room_area[:self.model.n_rooms])
+
+        if self.hvac is not None and rooms_changed and not self._hvac_from_model:
+            raise ValueError("The rooms changed, the HVAC layer passed in has to be rebuilt for the new model.")
+
+        if self.reduced_model is not None:
+            self.reduced_model.sync()
+
+        if changes["nodes"]:
+            # Nodes that survive the reload keep their temperatures, new ones start like a fresh solver.
+            thermal_solver = ThermalSolver(model.G, model.C, model.G_ext_air, model.G_ext_ground,
+                                           model.metadata["ground_temperature"], method=self.thermal_solver.method)
+            kept = [node_id for node_id in model.nodes if node_id in self.model.nodes]
+            thermal_solver.T[[model.nodes[node_id] for node_id in kept]] = \
+                self.thermal_solver.T[[self.model.nodes[node_id] for node_id in kept]]
+
+            self.thermal_solver = thermal_solver
+
+            # Checkpoints hold states of the old node layout.
+            self.checkpoints.clear()
+        elif changes["thermal"]:
+            self.thermal_solver.update(model.G, model.C, model.G_ext_air, model.G_ext_ground,
+                                       model.metadata["ground_temperature"])
+
+        if changes["connections"]:
+            self.weather_solver = WeatherSolver(model.external_connections, model.standards, model.N)
+
+            if self.orientation_table is not None:
+                self._build_orientation_table()
+
+        if self.hvac is not None and rooms_changed:
+            self.hvac = self._remap_hvac(HvacSystem.from_model(model), room_ids)
+
+        if self.reduced_model is not None and (changes["thermal"] or changes["connections"]):
+            self.reduced_model = ReducedModel(self.thermal_solver, min(self.reduced_model.order, model.N),
+                                              self.reduced_model.static_correction, self.weather_solver)
+        self.step_solver = self.thermal_solver if self.reduced_model is None else self.reduced_model
+
+        if self.kernel is not None and (changes["nodes"] or changes["connections"]):
+            self.kernel = StepKernel(self.thermal_solver, self.weather_solver, self.kernel_backend,
+                                     self.metrics.clock)
+
+        self.config_path = config_path
+        self.model = model
+        self.metadata = model.metadata
+
+        self.index_to_id = {v: k for k, v in model.nodes.items()}
+        self.room_ids = pd.Index(room_ids, name="room_id")
+        self.rooms = np.s_[:model.n_rooms]
+        self.layout = self._node_layout(model)
+
+        return changes
+
+    def snapshot(self):
+        if self.reduced_model is not None:
+            self.reduced_model.sync()
+
+        arrays = {
+            "format_version": self.CHECKPOINT_VERSION,
+            "time_ns": self.current_time.value,
+            "layout": self.layout,
+            "T": self.thermal_solver.T
+        }
+
+        if self.hvac is not None:
+            arrays.update({f"hvac_{name}": values for name, values in self.hvac.get_state().items()})
+
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+
+        return buffer.getvalue()
+
+    def restore(self, snapshot):
+        source = io.BytesIO(snapshot) if isinstance(snapshot, bytes) else snapshot
+
+        with np.load(source, allow_pickle=False) as data:
+            if int(data["format_version"]) != self.CHECKPOINT_VERSION:
+                raise ValueError(f"Unsupported checkpoint version {int(data['format_version'])}.")
+
+            # Checkpoint files outlive config reloads, a state only fits the node layout it was taken with.
+            if str(data["layout"]) != self.layout:
+                raise ValueError("Checkpoint was taken with a different node layout.")
+
+            if data["T"].shape != self.thermal_solver.T.shape:
+                raise ValueError(f"Checkpoint state {data['T'].shape} does not match the model "
+                                 f"{self.thermal_solver.T.shape}.")
+
+            self.thermal_solver.T[:] = data["T"]
+
+            if self.reduced_model is not None:
+                self.reduced_model.project()
+
+            if self.hvac is not None:
+                self.hvac.set_state({name[len("hvac_"):]: data[name] for name in data.files
+                                     if name.startswith("hvac_")})
+
+            self.current_time = pd.Timestamp(int(data["time_ns"]), tz="UTC").tz_convert(self.metadata["timezone"])
+
+        self.step_index = self.weather_service.index_of(self.current_time)
+
+    def save_checkpoint(self, path):
+        tmp_path = f"{path}.tmp"
+
+        with open(tmp_path, "wb") as f:
+            f.write(self.snapshot())
+
+        os.replace(tmp_path, path)
+
+    def ensure_weather_table(self, dt_seconds):
+        if self.weather_service.table_dt != dt_seconds:
+            self.weather_service.precompute(self.start_time, self.end_time, dt_seconds)
+            self.step_index = self.weather_service.index_of(self.current_time)
+            self._build_orientation_table()
+
+    def close(self):
+        if self.partitioned_solver is not None:
+            self.thermal_solver.T = self.partitioned_solver.T.copy()
+            self.partitioned_solver.close()
+            self.partitioned_solver = None
+
+    def _integrate(self, weather, dt_seconds, room_temps=None):
+        clock = self.metrics.clock
+
+        sun_radiation = weather["sun_radiation"]
+        sun_altitude = weather["sun_altitude"]
+        sun_azimuth = weather["sun_azimuth"]
+        wind_speed = weather["wind_speed"]
+        wind_direction = weather["wind_direction"]
+        temperature = weather["temperature"]
+
+        first_index = self.step_index
+        table_length = self.weather_service.table_length
+        incidence = self.orientation_table["incidence"]
+        exposure = self.orientation_table["exposure"]
+        gains_seconds = 0.0
+        gains_solve_seconds = 0.0
+
+        for k in range(len(temperature)):
+            row = (first_index + k) % table_length
+
+            if self.partitioned_solver is not None:
+                temperatures_array = self.partitioned_solver.step(
+                    dt_seconds, temperature[k], wind_speed[k], wind_direction[k],
+                    sun_radiation[k], sun_altitude[k], sun_azimuth[k]
+                )
+            elif self.kernel is not None:
+                t_gains_start = clock()
+
+                if self.hvac is not None:
+                    self.kernel.Q_extra[self.rooms] = self.hvac.step(self.thermal_solver.T[self.rooms],
+                                                                     temperature[k], dt_seconds)
+
+                gains_seconds += clock() - t_gains_start
+
+                temperatures_array = self.kernel.step(dt_seconds, temperature[k], wind_speed[k], wind_direction[k],
+                                                      sun_radiation[k], sun_altitude[k], sun_azimuth[k],
+                                                      incidence[row], exposure[row])
+
+                gains_seconds += self.kernel.gains_seconds
+                gains_solve_seconds += self.kernel.gains_solve_seconds
+            elif self.reduced_model is not None and self.hvac is None:
+                t_gains_start = clock()
+
+                inputs = self.reduced_model.weather_inputs(temperature[k], wind_speed[k], wind_direction[k],
+                                                           sun_radiation[k], sun_altitude[k], sun_azimuth[k],
+                                                           incidence[row], exposure[row])
+
+                gains_seconds += clock() - t_gains_start
+
+                self.reduced_model.step_inputs(dt_seconds, inputs)
+
+                if room_temps is not None:
+                    temperatures_array = self.reduced_model.reconstruct(rows=self.rooms)
+            else:
+                t_gains_start = clock()
+
+                q_env = self.weather_solver.calculate_environmental_gains(
+                    sun_radiation[k], sun_altitude[k], sun_azimuth[k],
+                    wind_speed[k], wind_direction[k], temperature[k], self.thermal_solver.T, incidence[row],
+                    exposure[row]
+                )
+
+                if self.hvac is not None:
+                    q_env[self.rooms] += self.hvac.step(self.thermal_solver.T[self.rooms], temperature[k], dt_seconds)
+
+                gains_seconds += clock() - t_gains_start
+
+                temperatures_array = self.step_solver.step(dt_seconds, temperature[k], q_env)
+
+            if room_temps is not None:
+                room_temps[k] = temperatures_array[self.rooms]
+
+            step_index = (first_index + k + 1) % table_length
+
+            if self.checkpoint_interval and step_index % self.checkpoint_interval == 0:
+                self._set_step_index(step_index, dt_seconds)
+                self._checkpoint(self.current_time)
+
+        self._set_step_index((first_index + len(temperature)) % table_length, dt_seconds)
+
+        if self.reduced_model is not None:
+            self.reduced_model.sync()
+
+        return gains_seconds, gains_solve_seconds
+
+    def _remap_hvac(self, hvac, room_ids):
+        state = self.hvac.get_state()
+        new_state = hvac.get_state()
+
+        old_room = {room_id: i for i, room_id in enumerate(self.room_ids)}
+        kept = [i for i, room_id in enumerate(room_ids) if room_id in old_room]
+        for name in ("heating", "cooling"):
+            new_state[name][kept] = state[name][[old_room[room_ids[i]] for i in kept]]
+
+        old_unit = {unit_id: i for i, unit_id in enumerate(self.hvac.unit_ids)}
+        kept = [i for i, unit_id in enumerate(hvac.unit_ids) if unit_id in old_unit]
+        new_state["electrical_energy_wh"][kept] = \
+            state["electrical_energy_wh"][[old_unit[hvac.unit_ids[i]] for i in kept]]
+
+        hvac.set_state(new_state)
+
+        return hvac
+
+    def _build_orientation_table(self):
+        # Solar incidence and wind exposure per facade orientation for every step of the weather table.
+        self.orientation_table = self.weather_solver.orientation_table(self.weather_service.table)
+
+    def _checkpoint(self, timestamp):
+        if self.checkpoint_dir is None:
+            self.checkpoints[timestamp.value] = self.snapshot()
+            return
+
+        path = os.path.join(self.checkpoint_dir, f"{timestamp.value}{self.CHECKPOINT_EXTENSION}")
+        self.save_checkpoint(path)
+        self.checkpoints[timestamp.value] = path
+
+    def _index_checkpoint_dir(self):
+        for file_name in os.listdir(self.checkpoint_dir):
+            name, extension = os.path.splitext(file_name)
+
+            if extension == self.CHECKPOINT_EXTENSION and name.isdigit():
+                self.checkpoints[int(name)] = os.path.join(self.checkpoint_dir, file_name)
+
+    @staticmethod
+    def _node_layout(model):
+        node_ids = sorted(model.nodes, key=model.nodes.get)
+
+        return hashlib.sha256("\n".join(node_ids).encode()).hexdigest()
+
+    def _set_step_index(self, step_index, dt_seconds):
+        self.step_index = int(step_index)
+        self.current_time = self.weather_service.table_start + timedelta(seconds=self.step_index * dt_seconds)
+
+    def _advance(self, dt_seconds):
+        self.current_time += timedelta(seconds=dt_seconds)
+
+        if self.current_time >= self.end_time:
+            self.current_time = self.start_time
+
+        if self.step_index is not None and dt_seconds == self.weather_service.table_dt:
+            self.step_index = (self.step_index + 1) % self.weather_service.table_length
+        else:
+            self.step_index = self.weather_service.index_of(self.current_time)
@@ -0,0 +1,103 @@
+﻿from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from ThermalSolver import ThermalSolver
+
+
+class EnsembleSimulation:
+    PERCENTILES = (5, 50, 95)
+
+    def __init__(self, simulation, members, temperature_std=1.0, wind_speed_rel_std=0.2, sun_radiation_rel_std=0.2,
+                 initial_std=0.5, process_noise_std=0.05, weather_correlation_seconds=6 * 3600,
+                 percentiles=PERCENTILES, seed=None):
+        self.simulation = simulation
+        self.members = members
+        self.process_noise_std = process_noise_std
+        self.weather_correlation_seconds = weather_correlation_seconds
+        self.percentiles = tuple(percentiles)
+        self.rng = np.random.default_rng(seed)
+
+        model = simulation.model
+        self.thermal_solver = ThermalSolver(
+            G=model.G,
+            C=model.C,
+            G_ext_air=model.G_ext_air,
+            G_ext_ground=model.G_ext_ground,
+            T_ground=simulation.metadata["ground_temperature"],
+            method=simulation.thermal_solver.method,
+            members=members
+        )
+        self.weather_solver = simulation.weather_solver
+
+        self.thermal_solver.T[:] = (simulation.thermal_solver.T[:, None] +
+                                    self.rng.normal(0.0, initial_std, self.thermal_solver.T.shape))
+
+        # Weather errors are AR(1) processes in units of their standard deviation: temperature, wind, radiation.
+        self.weather_std = np.array([temperature_std, wind_speed_rel_std, sun_radiation_rel_std])
+        self.weather_error = self.rng.standard_normal((3, members))
+
+        self.current_time = simulation.current_time
+
+    def run(self, n_steps, dt_seconds):
+        simulation = self.simulation
+        weather_service = simulation.weather_service
+
+        simulation.ensure_weather_table(dt_seconds)
+        step_index = weather_service.index_of(self.current_time)
+
+        if step_index is None:
+            raise ValueError(f"Current time {self.current_time} is not aligned to a {dt_seconds} s step.")
+
+        table_length = weather_service.table_length
+        steps = (step_index + np.arange(n_steps)) % table_length
+        weather = {name: values[steps] for name, values in weather_service.table.items()}
+
+        rho = np.exp(-dt_seconds / self.weather_correlation_seconds)
+        innovation_scale = np.sqrt(1.0 - rho ** 2)
+        process_noise_std = self.process_noise_std * np.sqrt(dt_seconds / 3600.0)
+
+        N = len(simulation.room_ids)
+        mean = np.empty((n_steps, N))
+        percentiles = np.empty((len(self.percentiles), n_steps, N))
+
+        T = self.thermal_solver.T
+
+        for k in range(n_steps):
+            self.weather_error = rho * self.weather_error + innovation_scale * self.rng.standard_normal(
+                self.weather_error.shape)
+            temperature_error, wind_error, radiation_error = self.weather_error * self.weather_std[:, None]
+
+            temperature = weather["temperature"][k] + temperature_error
+            wind_speed = np.maximum(weather["wind_speed"][k] * (1.0 + wind_error), 0.0)
+            sun_radiation = np.maximum(weather["sun_radiation"][k] * (1.0 + radiation_error), 0.0)
+
+            q_env = self.weather_solver.calculate_environmental_gains(
+                sun_radiation, weather["sun_altitude"][k], weather["sun_azimuth"][k],
+                wind_speed, weather["wind_direction"][k], temperature, T
+            )
+
+            self.thermal_solver.step(dt_seconds, temperature, q_env)
+
+            if process_noise_std > 0:
+                T += self.rng.normal(0.0, process_noise_std, T.shape)
+
+            mean[k] = T[:N].mean(axis=1)
+            percentiles[:, k] = np.percentile(T[:N], self.percentiles, axis=1)
+
+        timestamps = weather_service.table_start + pd.to_timedelta(steps * dt_seconds, unit="s")
+        timestamps.name = "timestamp"
+
+        step_index = int((step_index + n_steps) % table_length)
+        self.current_time = weather_service.table_start + timedelta(seconds=step_index * dt_seconds)
+
+        return {
+            "timestamp": timestamps,
+            "weather": pd.DataFrame(weather, index=timestamps),
+            "mean": pd.DataFrame(mean, index=timestamps, columns=simulation.room_ids),
+            "percentiles": {
+                percentile: pd.DataFrame(values, index=timestamps, columns=simulation.room_ids)
+                for percentile, values in zip(self.percentiles, percentiles)
+            }
+        }
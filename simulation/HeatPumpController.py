@@ -0,0 +1,154 @@
+﻿import time
+
+import numpy as np
+from scipy import sparse
+
+from ThermalSolver import ThermalSolver
+from WeatherSolver import WeatherSolver
+
+
+class HeatPumpController:
+    POWER_LEVELS = (0.0, 0.25, 0.5, 0.75, 1.0)
+
+    def __init__(self, model, hvac, dt_seconds=3600.0, horizon_steps=4, comfort_weight=100.0, energy_price=1.0,
+                 time_budget_s=0.05, batch_size=256, seed=None):
+        self.hvac = hvac
+        self.dt_seconds = dt_seconds
+        self.horizon_steps = horizon_steps
+        self.comfort_weight = comfort_weight
+        self.energy_price = np.broadcast_to(np.asarray(energy_price, dtype=np.float64), (horizon_steps,))
+        self.time_budget_s = time_budget_s
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+
+        self.N = model.N
+        self.n_rooms = model.n_rooms
+        self.n_units = hvac.n_units
+
+        self.thermal_solver = ThermalSolver(model.G, model.C, model.G_ext_air, model.G_ext_ground,
+                                            model.metadata["ground_temperature"], method="backward_euler")
+        self.weather_solver = WeatherSolver(model.external_connections, model.standards, model.N)
+
+        # Each unit's heat is split over its rooms in proportion to their emitter power.
+        unit_power = np.bincount(hvac.unit_of_room, weights=hvac.emitter_power_w, minlength=self.n_units)
+        shares = np.divide(hvac.emitter_power_w, unit_power[hvac.unit_of_room],
+                           out=np.zeros(self.n_rooms), where=unit_power[hvac.unit_of_room] > 0)
+        self.distribution = sparse.csr_matrix((shares, (np.arange(self.n_rooms), hvac.unit_of_room)),
+                                              shape=(self.N, self.n_units))
+
+        self.impulse_responses = self._build_impulse_responses(model)
+
+    def _build_impulse_responses(self, model):
+        H, N, U = self.horizon_steps, self.n_rooms, self.n_units
+
+        # The homogeneous part of the model (no weather, no ground) driven by 1 W per unit in the first step.
+        response_solver = ThermalSolver(model.G, model.C, model.G_ext_air, model.G_ext_ground, 0.0,
+                                        method="backward_euler", members=U)
+        response_solver.T[:] = 0.0
+
+        impulse = self.distribution.toarray()
+        impulse_responses = np.empty((H, N, U))
+
+        for k in range(H):
+            impulse_responses[k] = response_solver.step(self.dt_seconds, 0.0, impulse if k == 0 else 0.0)[:N]
+
+        return impulse_responses
+
+    def heating_response(self, plans):
+        H = self.horizon_steps
+        response = np.zeros((len(plans), H, self.n_rooms))
+
+        # The rooms' response to a plan is the convolution of its steps with the impulse responses, one (N x U)
+        # product per lag instead of an (H * N x H * U) Toeplitz matrix.
+        for lag in range(H):
+            response[:, lag:] += plans[:, :H - lag] @ self.impulse_responses[lag].T
+
+        return response
+
+    def free_response(self, T, forecast):
+        self.thermal_solver.T[:] = T
+        free = np.empty((self.horizon_steps, self.n_rooms))
+
+        for k in range(self.horizon_steps):
+            q_env = self.weather_solver.calculate_environmental_gains(
+                forecast["sun_radiation"][k], forecast["sun_altitude"][k], forecast["sun_azimuth"][k],
+                forecast["wind_speed"][k], forecast["wind_direction"][k], forecast["temperature"][k],
+                self.thermal_solver.T
+            )
+
+            free[k] = self.thermal_solver.step(self.dt_seconds, forecast["temperature"][k], q_env)[:self.n_rooms]
+
+        return free
+
+    def evaluate(self, plans, free, outside, capacity):
+        temperatures = free + self.heating_response(plans)
+        deficit = np.maximum(self.hvac.setpoint - temperatures, 0.0)
+
+        comfort_cost = self.comfort_weight * np.einsum("phn,phn->p", deficit, deficit)
+        # The same part-load COP the HVAC layer bills the heat at once the plan is applied.
+        cop = self.hvac.heating_cop(outside[:, None], plans, capacity)
+        electrical_wh = plans / cop * (self.dt_seconds / 3600.0)
+        energy_cost = np.einsum("phu,h->p", electrical_wh, self.energy_price)
+
+        return comfort_cost + energy_cost
+
+    def calculate_optimal_actions(self, T, forecast):
+        deadline = time.perf_counter() + self.time_budget_s
+        H, U = self.horizon_steps, self.n_units
+
+        outside = np.asarray(forecast["temperature"][:H], dtype=np.float64)
+        heating_power = np.interp(outside, self.hvac.HEATING_POWER_CURVE_TEMPS, self.hvac.HEATING_POWER_CURVE_WATTS)
+        capacity = heating_power[:, None] * self.hvac.capacity_scale[None, :]
+
+        free = self.free_response(T, forecast)
+
+        best_plan, best_cost = None, np.inf
+        evaluated = 0
+
+        # The structured plans go first, one start step per batch, but only the first batch is owed past the deadline.
+        for plans in self._structured_plans(capacity):
+            if best_plan is not None and time.perf_counter() >= deadline:
+                break
+
+            costs = self.evaluate(plans, free, outside, capacity)
+            evaluated += len(plans)
+
+            best = int(np.argmin(costs))
+            if costs[best] < best_cost:
+                best_plan, best_cost = plans[best], costs[best]
+
+        while time.perf_counter() < deadline:
+            plans = self._random_plans(capacity, best_plan)
+            costs = self.evaluate(plans, free, outside, capacity)
+            evaluated += len(plans)
+
+            best = int(np.argmin(costs))
+            if costs[best] < best_cost:
+                best_plan, best_cost = plans[best], costs[best]
+
+        predicted = free + self.heating_response(best_plan[None])[0]
+
+        return {
+            "plan": best_plan,
+            "cost": float(best_cost),
+            "room_heat": (self.distribution @ best_plan[0])[:self.n_rooms],
+            "predicted_temps": predicted,
+            "evaluated_plans": evaluated
+        }
+
+    def _structured_plans(self, capacity):
+        # The legacy plan shape: a fixed power level switched on from a given step to the end of the horizon.
+        for start in range(self.horizon_steps):
+            plans = np.zeros((len(self.POWER_LEVELS),) + capacity.shape)
+            plans[:, start:] = np.multiply.outer(self.POWER_LEVELS, capacity[start:])
+
+            yield plans
+
+    def _random_plans(self, capacity, best_plan):
+        half = self.batch_size // 2
+        H, U = capacity.shape
+
+        explore = self.rng.uniform(0.0, 1.0, (half, H, U)) * capacity
+        refine = best_plan + self.rng.normal(0.0, 0.1, (self.batch_size - half, H, U)) * capacity
+
+        return np.clip(np.concatenate([explore, refine]), 0.0, capacity)
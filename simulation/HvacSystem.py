@@ -0,0 +1,119 @@
+﻿import numpy as np
+
+
+class HvacSystem:
+    HEATING_POWER_CURVE_TEMPS = [-15.0, -7.0, 0.0, 7.0, 15.0]
+    HEATING_POWER_CURVE_WATTS = [5000.0, 6000.0, 7000.0, 8000.0, 8500.0]
+    HEATING_COP_CURVE_TEMPS = [-15.0, -7.0, 0.0, 7.0, 15.0]
+    HEATING_COP_CURVE_VALUES = [2.2, 2.8, 3.5, 4.5, 5.5]
+
+    COOLING_POWER_CURVE_TEMPS = [25.0, 30.0, 35.0]
+    COOLING_POWER_CURVE_WATTS = [7500.0, 7200.0, 7000.0]
+    COOLING_EER_CURVE_TEMPS = [25.0, 30.0, 35.0]
+    COOLING_EER_CURVE_VALUES = [4.0, 3.8, 3.5]
+
+    OPTIMAL_LOAD_PERCENT = 0.4
+    LOAD_PENALTY_FACTOR = 0.3
+    MIN_LOAD_FACTOR = 0.7
+
+    def __init__(self, unit_of_room, unit_ids, emitter_power_w, setpoint=20.0, hysteresis=2.0,
+                 cooling_setpoint=None, capacity_scale=1.0):
+        self.unit_of_room = np.asarray(unit_of_room, dtype=np.int64)
+        self.unit_ids = [str(unit_id) for unit_id in unit_ids]
+        self.n_units = len(self.unit_ids)
+        self.N = len(self.unit_of_room)
+
+        self.emitter_power_w = np.broadcast_to(np.asarray(emitter_power_w, dtype=np.float64), (self.N,)).copy()
+        self.setpoint = np.broadcast_to(np.asarray(setpoint, dtype=np.float64), (self.N,)).copy()
+        self.hysteresis = np.broadcast_to(np.asarray(hysteresis, dtype=np.float64), (self.N,)).copy()
+        self.capacity_scale = np.broadcast_to(np.asarray(capacity_scale, dtype=np.float64), (self.n_units,)).copy()
+
+        self.cooling_setpoint = None
+        if cooling_setpoint is not None:
+            self.cooling_setpoint = np.broadcast_to(np.asarray(cooling_setpoint, dtype=np.float64), (self.N,)).copy()
+
+        self.heating = np.zeros(self.N, dtype=bool)
+        self.cooling = np.zeros(self.N, dtype=bool)
+
+        self.thermal_power_w = np.zeros(self.n_units)
+        self.electrical_power_w = np.zeros(self.n_units)
+        self.electrical_energy_wh = np.zeros(self.n_units)
+
+    @classmethod
+    def from_model(cls, model, level="apartment", emitter_power_per_m2=100.0, **kwargs):
+        depth = {"apartment": 2, "building": 1}[level]
+
+        room_ids = sorted(model.nodes, key=model.nodes.get)[:model.n_rooms]
+        unit_keys = [":".join(room_id.split(":")[:depth]) for room_id in room_ids]
+        unit_ids, unit_of_room = np.unique(unit_keys, return_inverse=True)
+
+        return cls(unit_of_room, unit_ids, model.room_area[:model.n_rooms] * emitter_power_per_m2, **kwargs)
+
+    def get_state(self):
+        return {
+            "heating": self.heating.copy(),
+            "cooling": self.cooling.copy(),
+            "electrical_energy_wh": self.electrical_energy_wh.copy()
+        }
+
+    def set_state(self, state):
+        self.heating = np.asarray(state["heating"], dtype=bool).copy()
+        self.cooling = np.asarray(state["cooling"], dtype=bool).copy()
+        self.electrical_energy_wh = np.asarray(state["electrical_energy_wh"], dtype=np.float64).copy()
+
+    def step(self, T, T_outside, dt):
+        half_band = self.hysteresis / 2
+
+        self.heating = (T < self.setpoint - half_band) | (self.heating & (T < self.setpoint + half_band))
+        heat_demand = np.where(self.heating, self.emitter_power_w, 0.0)
+        unit_heat_demand = np.bincount(self.unit_of_room, weights=heat_demand, minlength=self.n_units)
+
+        # A heat pump runs in one mode at a time, heating takes priority over cooling within a unit.
+        if self.cooling_setpoint is not None:
+            self.cooling = ((T > self.cooling_setpoint + half_band) |
+                            (self.cooling & (T > self.cooling_setpoint - half_band)))
+            self.cooling &= unit_heat_demand[self.unit_of_room] == 0
+
+        cool_demand = np.where(self.cooling, self.emitter_power_w, 0.0)
+        unit_cool_demand = np.bincount(self.unit_of_room, weights=cool_demand, minlength=self.n_units)
+
+        heat_capacity = np.interp(T_outside, self.HEATING_POWER_CURVE_TEMPS,
+                                  self.HEATING_POWER_CURVE_WATTS) * self.capacity_scale
+        cool_capacity = np.interp(T_outside, self.COOLING_POWER_CURVE_TEMPS,
+                                  self.COOLING_POWER_CURVE_WATTS) * self.capacity_scale
+
+        heat_share = self._capacity_share(unit_heat_demand, heat_capacity)
+        cool_share = self._capacity_share(unit_cool_demand, cool_capacity)
+
+        unit_heat = unit_heat_demand * heat_share
+        unit_cool = unit_cool_demand * cool_share
+
+        cop = self.heating_cop(T_outside, unit_heat, heat_capacity)
+        eer = self._efficiency(np.interp(T_outside, self.COOLING_EER_CURVE_TEMPS, self.COOLING_EER_CURVE_VALUES),
+                               unit_cool, cool_capacity)
+
+        self.thermal_power_w = unit_heat - unit_cool
+        self.electrical_power_w = unit_heat / cop + unit_cool / eer
+        self.electrical_energy_wh += self.electrical_power_w * dt / 3600.0
+
+        return heat_demand * heat_share[self.unit_of_room] - cool_demand * cool_share[self.unit_of_room]
+
+    def heating_cop(self, T_outside, thermal_power, capacity):
+        return self._efficiency(np.interp(T_outside, self.HEATING_COP_CURVE_TEMPS, self.HEATING_COP_CURVE_VALUES),
+                                thermal_power, capacity)
+
+    @staticmethod
+    def _capacity_share(demand, capacity):
+        share = np.ones_like(demand)
+        np.divide(capacity, demand, out=share, where=demand > capacity)
+
+        return share
+
+    def _efficiency(self, base_efficiency, thermal_power, capacity):
+        load_percent = np.minimum(np.divide(thermal_power, capacity, out=np.zeros_like(thermal_power),
+                                            where=capacity > 0), 1.0)
+
+        load_factor = np.maximum(
+            1.0 - self.LOAD_PENALTY_FACTOR * (load_percent - self.OPTIMAL_LOAD_PERCENT) ** 2, self.MIN_LOAD_FACTOR)
+
+        return np.maximum(base_efficiency * load_factor, 1.0)
@@ -0,0 +1,81 @@
+﻿import itertools
+
+import numpy as np
+import pandas as pd
+
+from DistrictModel import DistrictModel
+from DistrictModelParser import DistrictModelParser
+from ThermalSolver import ThermalSolver
+from WeatherService import WeatherService
+from WeatherSolver import WeatherSolver
+
+
+class ParameterSweep:
+    def __init__(self, config_path, weather_path, grid, method="backward_euler", start_time="2024-01-01 00:00:00"):
+        parser = DistrictModelParser(config_path)
+        self.metadata = parser.raw_data["metadata"]
+
+        self.parameters = list(grid)
+        self.variants = [dict(zip(self.parameters, values)) for values in itertools.product(*grid.values())]
+
+        models = [DistrictModel.from_parser(parser, variant) for variant in self.variants]
+        self.rooms_per_variant = models[0].n_rooms
+        self.room_ids = pd.Index(sorted(models[0].nodes, key=models[0].nodes.get)[:self.rooms_per_variant],
+                                 name="room_id")
+
+        self.model = DistrictModel.stack(models, [f"v{i}" for i in range(len(models))])
+
+        self.thermal_solver = ThermalSolver(
+            G=self.model.G,
+            C=self.model.C,
+            G_ext_air=self.model.G_ext_air,
+            G_ext_ground=self.model.G_ext_ground,
+            T_ground=self.metadata["ground_temperature"],
+            method=method
+        )
+        self.weather_solver = WeatherSolver(self.model.external_connections, self.model.standards, self.model.N)
+
+        self.weather_service = WeatherService(weather_path, self.metadata["timezone"], self.metadata["latitude"],
+                                              self.metadata["longitude"])
+        self.start_time = pd.Timestamp(start_time).tz_localize(self.metadata["timezone"])
+
+    def run(self, n_steps, dt_seconds):
+        weather_service = self.weather_service
+        end_time = self.start_time + pd.Timedelta(seconds=n_steps * dt_seconds)
+        weather = weather_service.precompute(self.start_time, end_time, dt_seconds)
+
+        n_rooms = self.model.n_rooms
+        temperatures = np.empty((n_steps, n_rooms))
+
+        for k in range(n_steps):
+            q_env = self.weather_solver.calculate_environmental_gains(
+                weather["sun_radiation"][k], weather["sun_altitude"][k], weather["sun_azimuth"][k],
+                weather["wind_speed"][k], weather["wind_direction"][k], weather["temperature"][k],
+                self.thermal_solver.T
+            )
+
+            temperatures[k] = self.thermal_solver.step(dt_seconds, weather["temperature"][k], q_env)[:n_rooms]
+
+        return self._tidy(temperatures, weather_service.table_start, dt_seconds)
+
+    def _tidy(self, temperatures, start, dt_seconds):
+        n_steps = len(temperatures)
+        n_variants = len(self.variants)
+        n_rooms = self.rooms_per_variant
+
+        timestamps = start + pd.to_timedelta(np.arange(n_steps) * dt_seconds, unit="s")
+
+        # temperatures is (steps, variants * rooms); reorder to variant-major rows of (step, room).
+        values = temperatures.reshape(n_steps, n_variants, n_rooms).transpose(1, 0, 2).ravel()
+        variant = np.repeat(np.arange(n_variants), n_steps * n_rooms)
+
+        table = {"variant": variant}
+        for parameter in self.parameters:
+            table[parameter] = np.repeat([variant_values[parameter] for variant_values in self.variants],
+                                         n_steps * n_rooms)
+
+        table["timestamp"] = np.tile(np.repeat(timestamps, n_rooms), n_variants)
+        table["room_id"] = np.tile(self.room_ids.to_numpy(), n_steps * n_variants)
+        table["temperature"] = values
+
+        return pd.DataFrame(table)
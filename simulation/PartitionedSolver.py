@@ -0,0 +1,189 @@
+﻿import heapq
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ThermalSolver import ThermalSolver
+from WeatherSolver import WeatherSolver
+
+COMMAND_STEP = 0.0
+COMMAND_STOP = 1.0
+
+
+def _run_partition(partition, T_ground, method, T_name, inputs_name, N, start, done):
+    T_memory = shared_memory.SharedMemory(name=T_name)
+    inputs_memory = shared_memory.SharedMemory(name=inputs_name)
+
+    try:
+        T_shared = np.ndarray((N,), dtype=np.float64, buffer=T_memory.buf)
+        inputs = np.ndarray((PartitionedSolver.INPUT_SIZE,), dtype=np.float64, buffer=inputs_memory.buf)
+
+        room_idx = partition["room_idx"]
+
+        thermal_solver = ThermalSolver(partition["G"], partition["C"], partition["G_ext_air"],
+                                       partition["G_ext_ground"], T_ground, method=method)
+        weather_solver = WeatherSolver(partition["external_connections"], {}, len(room_idx))
+
+        while True:
+            start.wait()
+
+            if inputs[0] == COMMAND_STOP:
+                break
+
+            command, dt, temperature, wind_speed, wind_direction, sun_radiation, sun_altitude, sun_azimuth = inputs
+
+            thermal_solver.T[:] = T_shared[room_idx]
+
+            q_env = weather_solver.calculate_environmental_gains(
+                sun_radiation, sun_altitude, sun_azimuth, wind_speed, wind_direction, temperature, thermal_solver.T
+            )
+
+            T_shared[room_idx] = thermal_solver.step(dt, temperature, q_env)
+
+            done.wait()
+    except threading.BrokenBarrierError:
+        # Another partition failed or the main process gave up on the step, no further step will run.
+        pass
+    except Exception as e:
+        print(f"Partition error: {e}.")
+        start.abort()
+        done.abort()
+    finally:
+        # Drop the array views before closing, shared memory refuses to close while buffers are exported.
+        T_shared = inputs = None
+        T_memory.close()
+        inputs_memory.close()
+
+
+class PartitionedSolver:
+    INPUT_SIZE = 8
+
+    def __init__(self, model, T_ground, method="euler", workers=None, step_timeout=60.0):
+        workers = workers or multiprocessing.cpu_count()
+
+        self.N = model.N
+        self.step_timeout = step_timeout
+        self.broken = False
+        self.partitions = self.partition(model, workers)
+
+        self._T_memory = shared_memory.SharedMemory(create=True, size=self.N * 8)
+        self._inputs_memory = shared_memory.SharedMemory(create=True, size=self.INPUT_SIZE * 8)
+
+        self.T = np.ndarray((self.N,), dtype=np.float64, buffer=self._T_memory.buf)
+        self.T[:] = 21.0
+        self.inputs = np.ndarray((self.INPUT_SIZE,), dtype=np.float64, buffer=self._inputs_memory.buf)
+
+        context = multiprocessing.get_context()
+        self._start = context.Barrier(len(self.partitions) + 1)
+        self._done = context.Barrier(len(self.partitions) + 1)
+
+        self._processes = [
+            context.Process(
+                target=_run_partition,
+                args=(partition, T_ground, method, self._T_memory.name, self._inputs_memory.name, self.N,
+                      self._start, self._done),
+                daemon=True
+            )
+            for partition in self.partitions
+        ]
+
+        for process in self._processes:
+            process.start()
+
+    @staticmethod
+    def partition(model, workers):
+        building_of_room = np.array([room_id.split(":", 1)[0] for room_id in sorted(model.nodes, key=model.nodes.get)])
+        buildings, building_idx = np.unique(building_of_room, return_inverse=True)
+
+        G = model.G.tocoo()
+        if np.any(building_idx[G.row] != building_idx[G.col]):
+            raise ValueError("Buildings are thermally coupled, the model cannot be partitioned by building.")
+
+        sizes = np.bincount(building_idx, minlength=len(buildings))
+        bins = [(0, i, []) for i in range(min(workers, len(buildings)))]
+
+        for b in np.argsort(-sizes, kind="stable"):
+            load, i, members = heapq.heappop(bins)
+            members.append(b)
+            heapq.heappush(bins, (load + sizes[b], i, members))
+
+        local_idx = np.empty(model.N, dtype=np.int64)
+        connections = model.external_connections
+        partitions = []
+
+        for _, _, members in sorted(bins, key=lambda item: item[1]):
+            room_idx = np.flatnonzero(np.isin(building_idx, members))
+            local_idx[room_idx] = np.arange(len(room_idx))
+
+            mask = np.isin(connections["room_idx"], room_idx)
+            external_connections = {name: values[mask] for name, values in connections.items()}
+            external_connections["room_idx"] = local_idx[external_connections["room_idx"]]
+            external_connections["surface_idx"] = local_idx[external_connections["surface_idx"]]
+
+            partitions.append({
+                "room_idx": room_idx,
+                "G": model.G[room_idx][:, room_idx],
+                "C": model.C[room_idx].copy(),
+                "G_ext_air": model.G_ext_air[room_idx],
+                "G_ext_ground": model.G_ext_ground[room_idx],
+                "external_connections": external_connections
+            })
+
+        return partitions
+
+    def step(self, dt, temperature, wind_speed, wind_direction, sun_radiation, sun_altitude, sun_azimuth):
+        if self.broken:
+            raise RuntimeError("A partition worker failed, the partitioned solver cannot step any more.")
+
+        self.inputs[:] = (COMMAND_STEP, dt, temperature, wind_speed, wind_direction, sun_radiation, sun_altitude,
+                          sun_azimuth)
+
+        try:
+            self._start.wait(timeout=self.step_timeout)
+            self._done.wait(timeout=self.step_timeout)
+        except threading.BrokenBarrierError:
+            self._fail()
+            raise RuntimeError("A partition worker failed or timed out during the step.") from None
+
+        return self.T
+
+    def close(self):
+        if self._processes:
+            self.inputs[0] = COMMAND_STOP
+
+            try:
+                self._start.wait(timeout=5)
+            except threading.BrokenBarrierError:
+                pass
+
+            self._join_workers()
+
+        self.T = self.inputs = None
+        self._T_memory.close()
+        self._inputs_memory.close()
+
+        if not self.broken:
+            self._T_memory.unlink()
+            self._inputs_memory.unlink()
+
+    def _fail(self):
+        # The surviving workers leave their loops on the broken barriers. The segments are unlinked right away,
+        # the caller may still hold views of T, so their mappings are only closed in close().
+        self.broken = True
+        self._start.abort()
+        self._done.abort()
+        self._join_workers()
+
+        self._T_memory.unlink()
+        self._inputs_memory.unlink()
+
+    def _join_workers(self):
+        for process in self._processes:
+            process.join(timeout=5)
+
+            if process.is_alive():
+                process.terminate()
+
+        self._processes = []
@@ -0,0 +1,242 @@
+﻿import asyncio
+import json
+import math
+import time
+
+from TelemetryEncoder import TelemetryEncoder
+
+
+class RealtimeRunner:
+    MANUAL_WEATHER = (
+        ("Temp", "temperature"),
+        ("WindSpeed", "wind_speed"),
+        ("WindDir", "wind_direction"),
+        ("SunRadiation", "sun_radiation"),
+        ("SunAltitude", "sun_altitude"),
+        ("SunAzimuth", "sun_azimuth")
+    )
+
+    def __init__(self, simulation, url=None, connect=None, dt_seconds=3600.0, speed_factor=1.0, queue_size=4,
+                 max_lag_steps=100, encoding="json", delta_threshold=None, keyframe_interval=100,
+                 clock=time.monotonic):
+        if encoding not in ("json", "binary"):
+            raise ValueError(f"Unknown frame encoding: {encoding}.")
+
+        self.simulation = simulation
+        self.url = url
+        self.connect = connect if connect is not None else self._connect_websocket
+        self.dt_seconds = dt_seconds
+        self.queue_size = queue_size
+        self.max_lag_steps = max_lag_steps
+        self.clock = clock
+        self.encoding = encoding
+
+        self.encoder = None
+        if encoding == "binary":
+            self.encoder = TelemetryEncoder(simulation.room_ids, delta_threshold, keyframe_interval)
+
+        # With IsAuto off the simulation runs on the manual weather values instead of the weather history.
+        self.parameters = {"SpeedFactor": speed_factor, "IsAuto": True}
+        self.parameters.update((name, 0.0) for name, _ in self.MANUAL_WEATHER)
+        self._pending_parameters = {}
+        self._stop = None
+
+        self.steps = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.resyncs = 0
+
+    async def _connect_websocket(self):
+        import websockets
+
+        return await websockets.connect(self.url)
+
+    async def run(self, max_steps=None):
+        connection = await self.connect()
+        queue = asyncio.Queue(self.queue_size)
+        self._stop = asyncio.Event()
+
+        if self.encoder is not None:
+            await connection.send(self.encoder.schema_message())
+
+        receiver = asyncio.create_task(self._receive(connection))
+        sender = asyncio.create_task(self._send(connection, queue))
+
+        try:
+            await self._step_loop(queue, max_steps)
+
+            if not self._stop.is_set():
+                await queue.join()
+        finally:
+            receiver.cancel()
+            sender.cancel()
+            await asyncio.gather(receiver, sender, return_exceptions=True)
+            await connection.close()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+    async def _step_loop(self, queue, max_steps):
+        period = self.dt_seconds / self.parameters["SpeedFactor"]
+        anchor_time = self.clock()
+        anchor_step = 0
+
+        while not self._stop.is_set() and (max_steps is None or self.steps < max_steps):
+            if self._pending_parameters:
+                new_period = self._apply_parameters()
+
+                if new_period != period:
+                    # Keep the last step where it was and lay the following deadlines out at the new speed.
+                    last_step = max(self.steps - 1, anchor_step)
+                    anchor_time += (last_step - anchor_step) * period
+                    anchor_step = last_step
+                    period = new_period
+
+            delay = anchor_time + (self.steps - anchor_step) * period - self.clock()
+
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=delay)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+            elif -delay > self.max_lag_steps * period:
+                anchor_time = self.clock()
+                anchor_step = self.steps
+                self.resyncs += 1
+            else:
+                await asyncio.sleep(0)
+
+            # The step runs in a worker thread so the receiver and sender keep going while the model is solved. A failed
+            # step ends the run, run() closes the connection and the error reaches the caller.
+            result = await asyncio.to_thread(self.simulation.run_step, self.dt_seconds, self.encoder is not None,
+                                             self._manual_weather())
+            self.steps += 1
+
+            self._enqueue(queue, result)
+
+    def _enqueue(self, queue, result):
+        if queue.full():
+            queue.get_nowait()
+            queue.task_done()
+            self.frames_dropped += 1
+
+        queue.put_nowait(result)
+
+    def _apply_parameters(self):
+        parameters, self._pending_parameters = self._pending_parameters, {}
+        self.parameters.update(parameters)
+
+        return self.dt_seconds / self.parameters["SpeedFactor"]
+
+    def _manual_weather(self):
+        if self.parameters["IsAuto"]:
+            return None
+
+        return {key: float(self.parameters[name]) for name, key in self.MANUAL_WEATHER}
+
+    async def _send(self, connection, queue):
+        while True:
+            result = await queue.get()
+
+            try:
+                await connection.send(self.build_frame(result))
+                self.frames_sent += 1
+            except Exception as e:
+                print(f"Error: {e}.")
+                self._stop.set()
+            finally:
+                queue.task_done()
+
+    async def _receive(self, connection):
+        while not self._stop.is_set():
+            try:
+                message = await connection.recv()
+            except Exception as e:
+                print(f"Connection closed: {e}.")
+                self._stop.set()
+                break
+
+            self.handle_parameters(message)
+
+    def handle_parameters(self, message):
+        try:
+            parameters = json.loads(message)
+        except json.JSONDecodeError:
+            print(f"Invalid JSON: {message}.")
+            return
+
+        if not isinstance(parameters, dict):
+            print(f"Invalid parameters: {message}.")
+            return
+
+        parameters.pop("Type", None)
+
+        for name, value in parameters.items():
+            if name not in self.parameters:
+                print(f"Unsupported parameter: {name}.")
+            elif not self._is_valid_parameter(name, value):
+                print(f"Invalid {name}: {value}.")
+            else:
+                self._pending_parameters[name] = value
+
+    @staticmethod
+    def _is_valid_parameter(name, value):
+        if name == "IsAuto":
+            return isinstance(value, bool)
+
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            return False
+
+        return value > 0 if name == "SpeedFactor" else True
+
+    def build_frame(self, result):
+        if self.encoder is not None:
+            return self.encoder.encode(result, self.parameters["SpeedFactor"])
+
+        weather = result["weather"]
+
+        return json.dumps({
+            "Type": "SimulationData",
+            "Weather": {
+                "Temp": weather["temperature"],
+                "WindSpeed": weather["wind_speed"],
+                "WindDir": weather["wind_direction"],
+                "SunRadiation": weather["sun_radiation"],
+                "SunAltitude": float(weather["sun_altitude"]),
+                "SunAzimuth": float(weather["sun_azimuth"])
+            },
+            "Temperatures": {room_id: round(temp, 2) for room_id, temp in result["room_temps"].items()},
+            "SpeedFactor": self.parameters["SpeedFactor"],
+            "SimTimestamp": result["timestamp"]
+        })
+
+
+class LoopbackConnection:
+    def __init__(self, send_delay=0.0):
+        self.send_delay = send_delay
+        self.sent = []
+        self.incoming = asyncio.Queue()
+        self.closed = False
+
+    async def send(self, message):
+        if self.closed:
+            raise ConnectionError("Connection is closed.")
+
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+
+        self.sent.append(message)
+
+    async def recv(self):
+        message = await self.incoming.get()
+
+        if message is None:
+            raise ConnectionError("Connection is closed.")
+
+        return message
+
+    async def close(self):
+        self.closed = True
+        self.incoming.put_nowait(None)
@@ -0,0 +1,221 @@
+﻿import numpy as np
+from scipy import sparse
+from scipy.linalg import eigh
+from scipy.sparse.linalg import eigsh, splu
+
+
+class ReducedModel:
+    DENSE_LIMIT = 1000
+
+    def __init__(self, thermal_solver, order, static_correction=False, weather_solver=None):
+        if thermal_solver.members is not None:
+            raise ValueError("The reduced model does not support ensemble state.")
+
+        N = len(thermal_solver.C)
+
+        if not 0 < order <= N:
+            raise ValueError(f"Reduced order must be between 1 and {N}, got {order}.")
+
+        self.thermal_solver = thermal_solver
+        self.weather_solver = weather_solver
+        self.order = order
+        self.static_correction = static_correction
+        self.T = thermal_solver.T
+
+        self._scale = 1.0 / np.sqrt(thermal_solver.C)
+
+        # With y = C^1/2 T the network becomes y' = A y + C^-1/2 q with A = C^-1/2 L C^-1/2 symmetric and negative
+        # definite, so its eigenvectors are orthonormal and the slowest modes (eigenvalues closest to zero) are kept.
+        A = sparse.diags(self._scale) @ thermal_solver.L @ sparse.diags(self._scale)
+        n_modes = min(order + 1, N)
+
+        if N <= self.DENSE_LIMIT:
+            eigenvalues, eigenvectors = eigh(A.toarray(), subset_by_index=[N - n_modes, N - 1])
+        else:
+            # Identical buildings give repeated eigenvalues, a fixed start vector keeps the chosen modes reproducible.
+            v0 = np.random.default_rng(0).random(N)
+            eigenvalues, eigenvectors = eigsh(A.tocsc(), k=n_modes, sigma=0, which="LM", v0=v0)
+
+        slowest = np.argsort(-eigenvalues)
+        eigenvalues, eigenvectors = eigenvalues[slowest], eigenvectors[:, slowest]
+
+        self.eigenvalues = eigenvalues[:order]
+        self.modes = self._scale[:, None] * eigenvectors[:, :order]
+
+        # Decay rate of the slowest truncated mode, it bounds how the discarded part of the state evolves.
+        self.truncated_rate = -eigenvalues[order] if order < N else np.inf
+
+        # A node's share of the discarded modes is what its row of the orthonormal basis misses in the kept ones.
+        kept = np.einsum("ij,ij->i", eigenvectors[:, :order], eigenvectors[:, :order])
+        self._bound_scale = self._scale * np.sqrt(np.clip(1.0 - kept, 0.0, None))
+
+        self._lu = splu((-thermal_solver.L).tocsc()) if static_correction and order < N else None
+        self._propagators = {}
+
+        if weather_solver is not None:
+            self._project_inputs(eigenvectors[:, :order])
+
+        self.project()
+
+    def _project_inputs(self, kept_eigenvectors):
+        solver = self.thermal_solver
+        wind_weights = self.weather_solver.wind_weights.toarray()
+
+        # The weather-driven source is linear in a short input vector: outside air, ground, wind and solar gains per
+        # orientation, and the infiltration of every mode per orientation.
+        infiltration = (wind_weights[:, :, None] * self.modes[:, None, :]).reshape(len(wind_weights), -1)
+        inputs = np.column_stack([solver.G_ext_air, solver.Q_ground, wind_weights,
+                                  self.weather_solver.solar_weights.toarray(), -infiltration])
+
+        self.input_modes = self.modes.T @ inputs
+
+        # What the kept modes miss of each input column, the truncated norm of a source is a quadratic form in its
+        # input vector and no step has to touch all N nodes.
+        truncated = inputs * self._scale[:, None] - kept_eigenvectors @ self.input_modes
+        self._input_gram = truncated.T @ truncated
+
+    def project(self):
+        # Modal coordinates of the current temperatures, what the modes cannot represent starts the error bound.
+        y = self.T / self._scale
+        self.z = self.modes.T @ (self.T / self._scale ** 2)
+
+        self._truncation_bound = self._truncated_norm(y @ y, self.z @ self.z)
+        self._residual_bound = self._truncation_bound
+        self._previous_source = (None, None, None, 0.0)
+        self._last_source = None
+        self._stale = False
+
+        return self.z
+
+    def step(self, dt, T_outside, Q_extra):
+        solver = self.thermal_solver
+
+        Q_source = solver.G_ext_air * T_outside + solver.Q_ground + Q_extra
+        source_modal = self.modes.T @ Q_source
+
+        scaled = Q_source * self._scale
+        self._advance(dt, "vector", Q_source, source_modal,
+                      self._truncated_norm(scaled @ scaled, source_modal @ source_modal))
+        self._stale = True
+
+        return self.sync()
+
+    def weather_inputs(self, temperature, wind_speed, wind_direction, sun_radiation, sun_altitude, sun_azimuth,
+                       incidence=None, exposure=None):
+        # The input vector of _project_inputs for the current modal state, O(orientations x order).
+        if incidence is None:
+            incidence = self.weather_solver.solar_incidence(sun_altitude, sun_azimuth)
+        if exposure is None:
+            exposure = self.weather_solver.wind_exposure(wind_direction)
+
+        wind = exposure * wind_speed
+
+        return np.concatenate(([temperature, 1.0], wind * temperature, incidence * sun_radiation,
+                               np.outer(wind, self.z).ravel()))
+
+    def step_inputs(self, dt, inputs):
+        # Advances the modal state only, reconstruct or sync when temperatures are needed.
+        source_modal = self.input_modes @ inputs
+
+        self._advance(dt, "inputs", inputs, source_modal, self._truncated_norm(inputs @ self._input_gram @ inputs, 0.0))
+        self._stale = True
+
+        return self.z
+
+    def sync(self):
+        # Brings the full temperature vector up to date after steps that only advanced the modal state.
+        if self._stale:
+            self.reconstruct(out=self.T)
+            self._stale = False
+
+        return self.T
+
+    def reconstruct(self, out=None, rows=None):
+        modes = self.modes if rows is None else self.modes[rows]
+        T = np.dot(modes, self.z, out=out)
+
+        # Static correction takes the truncated modes at their steady state for the input, it only pays off when
+        # they settle well within a step.
+        if self._lu is not None and self._last_source is not None:
+            kind, source, source_modal = self._last_source
+            Q_source = source if kind == "vector" else self._input_source(source)
+
+            correction = self._lu.solve(Q_source) + self.modes @ (source_modal / self.eigenvalues)
+            T += correction if rows is None else correction[rows]
+
+        return T
+
+    def error_bound(self):
+        # Bound on |T_full - T_reduced| per node against the exact solution of the full network for the same input.
+        bound = self._residual_bound if self._lu is not None else self._truncation_bound
+
+        return bound * self._bound_scale
+
+    def _advance(self, dt, kind, source, source_modal, truncated_source):
+        decay, gain = self._get_propagator(dt)
+        self.z = decay * self.z + gain * source_modal
+
+        self._update_bounds(dt, truncated_source, self._truncated_change(kind, source, source_modal,
+                                                                         truncated_source))
+
+        self._previous_source = (kind, source, source_modal, truncated_source)
+        self._last_source = (kind, source, source_modal)
+
+    def _truncated_change(self, kind, source, source_modal, truncated_source):
+        previous_kind, previous, previous_modal, previous_truncated = self._previous_source
+
+        # A full source vector and an input vector cannot be subtracted cheaply, the triangle inequality bounds the
+        # change between them (and from the zero source after a projection).
+        if kind != previous_kind:
+            return truncated_source + previous_truncated
+
+        delta = source - previous
+
+        if kind == "inputs":
+            return self._truncated_norm(delta @ self._input_gram @ delta, 0.0)
+
+        delta *= self._scale
+        delta_modal = source_modal - previous_modal
+
+        return self._truncated_norm(delta @ delta, delta_modal @ delta_modal)
+
+    def _update_bounds(self, dt, truncated_source, truncated_change):
+        rate = self.truncated_rate
+
+        if not np.isfinite(rate):
+            return
+
+        decay = np.exp(-rate * dt)
+
+        self._truncation_bound = decay * self._truncation_bound + (1.0 - decay) / rate * truncated_source
+
+        # The quasi-static part follows the input, so every change of the input restarts its share of the decay.
+        self._residual_bound = decay * (self._residual_bound + truncated_change / rate)
+
+    def _input_source(self, inputs):
+        solver = self.thermal_solver
+        weather = self.weather_solver
+        n_orientations = weather.n_orientations
+
+        wind, solar, infiltration = np.split(inputs[2:], [n_orientations, 2 * n_orientations])
+        infiltration = infiltration.reshape(n_orientations, self.order)
+
+        Q_source = solver.G_ext_air * inputs[0] + solver.Q_ground * inputs[1]
+        Q_source += weather.wind_weights @ wind + weather.solar_weights @ solar
+        Q_source -= np.asarray(weather.wind_weights.multiply(self.modes @ infiltration.T).sum(axis=1)).ravel()
+
+        return Q_source
+
+    def _get_propagator(self, dt):
+        if dt not in self._propagators:
+            decay = np.exp(self.eigenvalues * dt)
+            self._propagators[dt] = (decay, (decay - 1.0) / self.eigenvalues)
+
+        return self._propagators[dt]
+
+    @staticmethod
+    def _truncated_norm(norm_squared, kept_squared):
+        return np.sqrt(max(norm_squared - kept_squared, 0.0))
+
+    def invalidate(self):
+        self._propagators.clear()
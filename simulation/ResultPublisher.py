@@ -0,0 +1,346 @@
+﻿import collections
+import importlib.util
+import json
+import queue
+import threading
+import time
+import zlib
+
+import numpy as np
+
+
+class ResultPublisher:
+    WEATHER_KEYS = (
+        ("Temp", "temperature"),
+        ("WindSpeed", "wind_speed"),
+        ("WindDir", "wind_direction"),
+        ("SunRadiation", "sun_radiation"),
+        ("SunAltitude", "sun_altitude"),
+        ("SunAzimuth", "sun_azimuth")
+    )
+    OVERFLOW = ("block", "drop_oldest")
+
+    def __init__(self, room_ids, url=None, connect=None, exchange="simulation", routing_key="simulation.results",
+                 batch_steps=32, buffer_size=8, overflow="block", compression_level=6, retry_delay=1.0,
+                 max_retry_delay=30.0, max_retries=8, keepalive_interval=10.0):
+        if overflow not in self.OVERFLOW:
+            raise ValueError(f"Unknown overflow policy: {overflow}.")
+
+        if batch_steps < 1 or buffer_size < 1:
+            raise ValueError("Batch and buffer sizes must be at least 1.")
+
+        # pika is optional, without it the publisher should fail here rather than retry in the sender thread.
+        if connect is None and importlib.util.find_spec("pika") is None:
+            raise ImportError("The pika package is required to publish to RabbitMQ, install it or pass connect.")
+
+        self.room_ids = [str(room_id) for room_id in room_ids]
+        self.url = url
+        self.connect = connect if connect is not None else self._connect_pika
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.batch_steps = batch_steps
+        self.overflow = overflow
+        self.compression_level = compression_level
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_retries = max_retries
+        self.keepalive_interval = keepalive_interval
+
+        self.sequence = 0
+        self.batches_sent = 0
+        self.batches_dropped = 0
+        self.batches_failed = 0
+        self.steps_sent = 0
+        self.bytes_sent = 0
+        self.bytes_raw = 0
+        self.retries = 0
+
+        # Published rows wait as the chunks they arrived in, a batch copies only its own rows out of them.
+        self._chunks = collections.deque()
+        self._offset = 0
+        self._pending_steps = 0
+
+        # Sealed batches wait here for the sender thread, a full buffer holds the simulation back (or sheds the
+        # oldest batch) instead of letting memory grow while the broker is slow.
+        self._queue = queue.Queue(buffer_size)
+        self._channel = None
+        self._closed = False
+        self._abort = threading.Event()
+        self._sender = threading.Thread(target=self._send_loop, name="result-publisher", daemon=True)
+        self._sender.start()
+
+    def _connect_pika(self):
+        return PikaChannel(self.url, self.exchange)
+
+    def publish(self, result):
+        room_temps = result["room_temps"]
+
+        if isinstance(room_temps, dict):
+            room_temps = [room_temps[room_id] for room_id in self.room_ids]
+
+        weather = result["weather"]
+
+        self._add([result["timestamp"]], np.array([[weather[key] for _, key in self.WEATHER_KEYS]], dtype=np.float64),
+                  np.asarray(room_temps, dtype=np.float64)[None, :])
+
+    def publish_run(self, result):
+        # The output of DistrictSimulation.run, one row per step.
+        weather = result["weather"]
+
+        self._add([timestamp.isoformat() for timestamp in result["timestamp"]],
+                  np.column_stack([weather[key].to_numpy(dtype=np.float64) for _, key in self.WEATHER_KEYS]),
+                  result["room_temps"][self.room_ids].to_numpy())
+
+    def flush(self, timeout=None):
+        # True once every sealed batch has left the buffer, False if the timeout ran out first.
+        if self._pending_steps:
+            self._seal(self._pending_steps)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        # queue.join() cannot time out, so wait on the queue's own condition.
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+
+                if remaining is not None and remaining <= 0:
+                    return False
+
+                self._queue.all_tasks_done.wait(remaining)
+
+        return True
+
+    def close(self, timeout=None):
+        if self._closed:
+            return True
+
+        flushed = self.flush(timeout)
+        self._closed = True
+
+        # Batches still waiting on the broker are given up, the sender drops them and exits.
+        if not flushed:
+            self._abort.set()
+
+        self._queue.put(None)
+        self._sender.join()
+
+        return flushed
+
+    def _add(self, timestamps, weather, temperatures):
+        self._chunks.append((timestamps, weather, temperatures))
+        self._pending_steps += len(timestamps)
+
+        while self._pending_steps >= self.batch_steps:
+            self._seal(self.batch_steps)
+
+    def _take(self, n_steps):
+        timestamps, weather, temperatures = [], [], []
+
+        while n_steps:
+            chunk_timestamps, chunk_weather, chunk_temperatures = self._chunks[0]
+            end = min(self._offset + n_steps, len(chunk_timestamps))
+
+            timestamps.extend(chunk_timestamps[self._offset:end])
+            weather.append(chunk_weather[self._offset:end])
+            temperatures.append(chunk_temperatures[self._offset:end])
+            n_steps -= end - self._offset
+
+            if end == len(chunk_timestamps):
+                self._chunks.popleft()
+                self._offset = 0
+            else:
+                self._offset = end
+
+        return timestamps, np.concatenate(weather), np.concatenate(temperatures)
+
+    def _seal(self, n_steps):
+        timestamps, weather, temperatures = self._take(n_steps)
+
+        payload = json.dumps({
+            "Type": "SimulationBatch",
+            "Sequence": self.sequence,
+            "Rooms": self.room_ids,
+            "Timestamps": timestamps,
+            "Weather": {name: values for (name, _), values in zip(self.WEATHER_KEYS, weather.T.tolist())},
+            "Temperatures": np.round(temperatures, 2).tolist()
+        }).encode()
+
+        body = zlib.compress(payload, self.compression_level)
+        headers = {
+            "sequence": self.sequence,
+            "steps": n_steps,
+            "first_timestamp": timestamps[0],
+            "last_timestamp": timestamps[-1]
+        }
+
+        self._pending_steps -= n_steps
+
+        self.sequence += 1
+        self.bytes_raw += len(payload)
+        self._enqueue((body, headers))
+
+    def _enqueue(self, message):
+        if self.overflow == "block":
+            self._queue.put(message)
+            return
+
+        while True:
+            try:
+                self._queue.put_nowait(message)
+                return
+            except queue.Full:
+                pass
+
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self.batches_dropped += 1
+            except queue.Empty:
+                pass
+
+    def _send_loop(self):
+        while True:
+            try:
+                message = self._queue.get(timeout=self.keepalive_interval)
+            except queue.Empty:
+                self._keepalive()
+                continue
+
+            try:
+                if message is None:
+                    self._close_channel()
+                    return
+
+                if self._abort.is_set():
+                    self.batches_dropped += 1
+                else:
+                    self._send(*message)
+            finally:
+                self._queue.task_done()
+
+    def _send(self, body, headers):
+        delay = self.retry_delay
+        attempts = 0
+
+        # At-least-once: a batch is retried on a fresh connection until the broker confirms it, up to max_retries
+        # times (None retries for as long as the publisher is open).
+        while True:
+            try:
+                if self._channel is None:
+                    self._channel = self.connect()
+
+                self._channel.publish(self.routing_key, body, headers)
+
+                self.batches_sent += 1
+                self.steps_sent += headers["steps"]
+                self.bytes_sent += len(body)
+                return
+            except Exception as e:
+                print(f"Publish of batch {headers['sequence']} failed: {e}.")
+                self._close_channel()
+
+            if self._abort.is_set() or (self.max_retries is not None and attempts >= self.max_retries):
+                print(f"Giving up on batch {headers['sequence']}.")
+                self.batches_failed += 1
+                return
+
+            attempts += 1
+            self.retries += 1
+
+            self._abort.wait(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    def _keepalive(self):
+        if self._channel is None:
+            return
+
+        try:
+            self._channel.process_events()
+        except Exception as e:
+            print(f"Connection lost: {e}.")
+            self._close_channel()
+
+    def _close_channel(self):
+        if self._channel is None:
+            return
+
+        try:
+            self._channel.close()
+        except Exception:
+            pass
+
+        self._channel = None
+
+
+class PikaChannel:
+    CONTENT_TYPE = "application/json"
+    CONTENT_ENCODING = "zlib"
+
+    def __init__(self, url, exchange, exchange_type="topic"):
+        import pika
+
+        self._pika = pika
+        self.exchange = exchange
+
+        self.connection = pika.BlockingConnection(pika.URLParameters(url))
+        self.channel = self.connection.channel()
+        self.channel.exchange_declare(exchange, exchange_type=exchange_type, durable=True)
+
+        # With confirms enabled, basic_publish returns once the broker has taken the message and raises on a nack.
+        self.channel.confirm_delivery()
+
+    def publish(self, routing_key, body, headers):
+        properties = self._pika.BasicProperties(content_type=self.CONTENT_TYPE,
+                                                content_encoding=self.CONTENT_ENCODING, delivery_mode=2,
+                                                headers=headers)
+
+        self.channel.basic_publish(self.exchange, routing_key, body, properties)
+
+    def process_events(self):
+        self.connection.process_data_events(0)
+
+    def close(self):
+        if self.connection.is_open:
+            self.connection.close()
+
+
+class LoopbackBroker:
+    def __init__(self, publish_delay=0.0, fail_publishes=0):
+        self.publish_delay = publish_delay
+        self.fail_publishes = fail_publishes
+        self.messages = []
+        self.connections = 0
+
+    def connect(self):
+        self.connections += 1
+
+        return LoopbackChannel(self)
+
+    def decoded(self):
+        return [json.loads(zlib.decompress(body)) for _, body, _ in self.messages]
+
+
+class LoopbackChannel:
+    def __init__(self, broker):
+        self.broker = broker
+        self.closed = False
+
+    def publish(self, routing_key, body, headers):
+        if self.closed:
+            raise ConnectionError("Channel is closed.")
+
+        if self.broker.publish_delay:
+            time.sleep(self.broker.publish_delay)
+
+        if self.broker.fail_publishes > 0:
+            self.broker.fail_publishes -= 1
+            raise ConnectionError("Broker rejected the message.")
+
+        self.broker.messages.append((routing_key, body, dict(headers)))
+
+    def process_events(self):
+        if self.closed:
+            raise ConnectionError("Channel is closed.")
+
+    def close(self):
+        self.closed = True
@@ -0,0 +1,140 @@
+﻿import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _no_clock():
+    return 0.0
+
+
+class SimulationMetrics:
+    PREFIX = "simulation"
+    # gains_solve is the numba Euler kernel, which computes the gains and the update in a single pass.
+    STAGES = ("weather", "gains", "solve", "gains_solve", "serialise")
+    STEP_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.clock = time.perf_counter if enabled else _no_clock
+
+        self.steps = 0
+        self.errors = {}
+        self.stage_seconds = dict.fromkeys(self.STAGES, 0.0)
+        self.stage_last_seconds = dict.fromkeys(self.STAGES, 0.0)
+        self.step_bucket_counts = [0] * (len(self.STEP_BUCKETS) + 1)
+        self.step_seconds = 0.0
+
+        self._server = None
+
+    def observe_step(self, t_start, t_weather, t_gains, t_solve, t_serialise, gains_solve_seconds=0.0):
+        if not self.enabled:
+            return
+
+        self._observe_stage("weather", t_weather - t_start)
+        self._observe_stage("gains", t_gains - t_weather)
+        self._observe_stage("solve", t_solve - t_gains - gains_solve_seconds)
+        self._observe_stage("gains_solve", gains_solve_seconds)
+        self._observe_stage("serialise", t_serialise - t_solve)
+
+        self._observe_steps(1, t_serialise - t_start)
+
+    def observe_batch(self, n_steps, t_start, t_weather, t_solve, t_serialise, gains_seconds, gains_solve_seconds=0.0):
+        if not self.enabled or n_steps == 0:
+            return
+
+        self._observe_stage("weather", t_weather - t_start)
+        self._observe_stage("gains", gains_seconds)
+        self._observe_stage("solve", t_solve - t_weather - gains_seconds - gains_solve_seconds)
+        self._observe_stage("gains_solve", gains_solve_seconds)
+        self._observe_stage("serialise", t_serialise - t_solve)
+
+        self._observe_steps(n_steps, (t_serialise - t_start) / n_steps)
+
+    def observe_error(self, error):
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def _observe_stage(self, stage, seconds):
+        self.stage_seconds[stage] += seconds
+        self.stage_last_seconds[stage] = seconds
+
+    def _observe_steps(self, n_steps, seconds_per_step):
+        self.steps += n_steps
+        self.step_seconds += seconds_per_step * n_steps
+        self.step_bucket_counts[bisect.bisect_left(self.STEP_BUCKETS, seconds_per_step)] += n_steps
+
+    def render(self):
+        prefix = self.PREFIX
+        lines = [
+            f"# HELP {prefix}_steps_total Simulation steps completed.",
+            f"# TYPE {prefix}_steps_total counter",
+            f"{prefix}_steps_total {self.steps}",
+            f"# HELP {prefix}_errors_total Simulation steps that raised, by exception type.",
+            f"# TYPE {prefix}_errors_total counter"
+        ]
+
+        lines += [f'{prefix}_errors_total{{type="{name}"}} {count}' for name, count in self.errors.items()]
+
+        lines += [
+            f"# HELP {prefix}_stage_seconds_total Time spent in each step stage.",
+            f"# TYPE {prefix}_stage_seconds_total counter"
+        ]
+        lines += [f'{prefix}_stage_seconds_total{{stage="{stage}"}} {seconds:.9f}'
+                  for stage, seconds in self.stage_seconds.items()]
+
+        lines += [
+            f"# HELP {prefix}_stage_last_seconds Duration of each stage in the latest step.",
+            f"# TYPE {prefix}_stage_last_seconds gauge"
+        ]
+        lines += [f'{prefix}_stage_last_seconds{{stage="{stage}"}} {seconds:.9f}'
+                  for stage, seconds in self.stage_last_seconds.items()]
+
+        lines += [
+            f"# HELP {prefix}_step_seconds Duration of a full simulation step.",
+            f"# TYPE {prefix}_step_seconds histogram"
+        ]
+
+        cumulative = 0
+        for bound, count in zip(self.STEP_BUCKETS, self.step_bucket_counts):
+            cumulative += count
+            lines.append(f'{prefix}_step_seconds_bucket{{le="{bound}"}} {cumulative}')
+
+        lines += [
+            f'{prefix}_step_seconds_bucket{{le="+Inf"}} {self.steps}',
+            f"{prefix}_step_seconds_sum {self.step_seconds:.9f}",
+            f"{prefix}_step_seconds_count {self.steps}"
+        ]
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = metrics.render().encode()
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+        return self._server
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
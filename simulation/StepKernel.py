@@ -0,0 +1,215 @@
+﻿import time
+
+import numpy as np
+
+try:
+    # scipy's own CSR kernel accumulates into a caller's buffer, the public product allocates its result every call.
+    from scipy.sparse._sparsetools import csr_matvec
+except ImportError:
+    csr_matvec = None
+
+
+def _fused_step(T, out, gains_only, L_indptr, L_indices, L_data, C, G_ext_air, Q_ground, Q_extra, dt,
+                orientation_indptr, orientation_indices, wind_data, solar_data, exposure, incidence, sun_rad,
+                wind_speed, temperature):
+    # One pass over the nodes: weather gains, then (for explicit Euler) conductance flows and the update, all read
+    # from the old state. With gains_only the gains are written to out for an implicit solve instead.
+    for i in range(len(T)):
+        wind = 0.0
+        solar = 0.0
+
+        for k in range(orientation_indptr[i], orientation_indptr[i + 1]):
+            orientation = orientation_indices[k]
+            wind += wind_data[k] * exposure[orientation]
+            solar += solar_data[k] * incidence[orientation]
+
+        q = wind * wind_speed * (temperature - T[i]) + solar * sun_rad
+
+        if gains_only:
+            out[i] = q
+            continue
+
+        q += G_ext_air[i] * temperature + Q_ground[i] + Q_extra[i]
+
+        for k in range(L_indptr[i], L_indptr[i + 1]):
+            q += L_data[k] * T[L_indices[k]]
+
+        out[i] = T[i] + q / C[i] * dt
+
+    if not gains_only:
+        T[:] = out
+
+
+_jit_step = None
+
+
+def _matvec_add(matrix, x, out):
+    if csr_matvec is None:
+        out += matrix @ x
+    else:
+        csr_matvec(matrix.shape[0], matrix.shape[1], matrix.indptr, matrix.indices, matrix.data, x, out)
+
+
+def _load_jit_step():
+    global _jit_step
+
+    if _jit_step is None:
+        import numba
+
+        _jit_step = numba.njit(cache=True)(_fused_step)
+
+    return _jit_step
+
+
+class StepKernel:
+    BACKENDS = ("auto", "numpy", "numba")
+    # Past this size the jitted loop is slower than scipy's CSR products, auto only uses it while call overhead
+    # dominates.
+    AUTO_NUMBA_MAX_NODES = 1000
+
+    def __init__(self, thermal_solver, weather_solver, backend="auto", clock=time.perf_counter):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown step kernel backend: {backend}.")
+
+        if thermal_solver.members is not None:
+            raise ValueError("The step kernel does not support ensemble state.")
+
+        self.thermal_solver = thermal_solver
+        self.weather_solver = weather_solver
+        self.T = thermal_solver.T
+        self.clock = clock
+
+        # Stage times of the latest step, the numba Euler loop computes gains and the update in one pass.
+        self.gains_seconds = 0.0
+        self.gains_solve_seconds = 0.0
+
+        N = len(self.T)
+
+        # Workspace reused by every step, Q_extra is filled by the caller (e.g. HVAC heat) before stepping.
+        self.Q_extra = np.zeros(N)
+        self.gains = np.zeros(N)
+        self._source = np.empty(N)
+        self._flow = np.empty(N)
+        self._rhs = np.empty(N)
+        self._scratch = np.empty(N)
+        self._solar = np.empty(weather_solver.n_orientations)
+
+        self._fused_step = None
+        self.backend = "numpy"
+
+        if backend == "numba" or (backend == "auto" and N <= self.AUTO_NUMBA_MAX_NODES):
+            try:
+                self._fused_step = _load_jit_step()
+                self.backend = "numba"
+            except ImportError:
+                if backend == "numba":
+                    raise
+
+        # The jitted loops index noticeably faster with 64-bit CSR indices than with scipy's 32-bit ones.
+        self._L = None
+        self._L_args = None
+        self._weight_args = None
+
+        if self.backend == "numba":
+            self._weight_args = self._csr_args(weather_solver.wind_weights) + (weather_solver.solar_weights.data,)
+
+    def step(self, dt, temperature, wind_speed, wind_direction, sun_radiation, sun_altitude, sun_azimuth,
+             incidence=None, exposure=None):
+        solver = self.thermal_solver
+        weather = self.weather_solver
+        t_start = self.clock()
+
+        # Per-orientation factors, rows of the precomputed annual table when the caller has them.
+        if incidence is None:
+            incidence = weather.solar_incidence(sun_altitude, sun_azimuth)
+        if exposure is None:
+            exposure = weather.wind_exposure(wind_direction)
+
+        if self.backend == "numba":
+            euler = solver.method == "euler"
+
+            # The solver swaps in a new L when its network is updated.
+            if solver.L is not self._L:
+                self._L, self._L_args = solver.L, self._csr_args(solver.L)
+
+            self._fused_step(self.T, self._rhs if euler else self.gains, not euler, *self._L_args, solver.C,
+                             solver.G_ext_air, solver.Q_ground, self.Q_extra, float(dt), *self._weight_args, exposure,
+                             incidence, float(sun_radiation), float(wind_speed), float(temperature))
+
+            if euler:
+                self.gains_seconds = 0.0
+                self.gains_solve_seconds = self.clock() - t_start
+                return self.T
+        else:
+            self._numpy_gains(temperature, wind_speed, sun_radiation, incidence, exposure)
+
+        self.gains_seconds = self.clock() - t_start
+        self.gains_solve_seconds = 0.0
+
+        return self._update(dt, temperature)
+
+    @staticmethod
+    def _csr_args(matrix):
+        return matrix.indptr.astype(np.int64), matrix.indices.astype(np.int64), matrix.data
+
+    def _numpy_gains(self, temperature, wind_speed, sun_radiation, incidence, exposure):
+        weather = self.weather_solver
+
+        self.gains.fill(0.0)
+        _matvec_add(weather.wind_weights, exposure, self.gains)
+        self.gains *= wind_speed
+
+        np.subtract(temperature, self.T, out=self._scratch)
+        self.gains *= self._scratch
+
+        np.multiply(incidence, sun_radiation, out=self._solar)
+        _matvec_add(weather.solar_weights, self._solar, self.gains)
+
+    def _update(self, dt, temperature):
+        solver = self.thermal_solver
+        L = solver.L
+
+        source = self._source
+        np.multiply(solver.G_ext_air, temperature, out=source)
+        source += solver.Q_ground
+        source += self.gains
+        source += self.Q_extra
+
+        flow = self._flow
+        rhs = self._rhs
+
+        if solver.method == "euler":
+            flow.fill(0.0)
+            _matvec_add(L, self.T, flow)
+            flow += source
+            flow /= solver.C
+            flow *= dt
+            self.T += flow
+        elif solver.method == "backward_euler":
+            np.divide(solver.C, dt, out=rhs)
+            rhs *= self.T
+            rhs += source
+
+            self.T[:] = solver.get_propagator(dt).solve(rhs)
+        elif solver.method == "crank_nicolson":
+            flow.fill(0.0)
+            _matvec_add(L, self.T, flow)
+            flow *= 0.5
+
+            np.divide(solver.C, dt, out=rhs)
+            rhs *= self.T
+            rhs += flow
+            rhs += source
+
+            self.T[:] = solver.get_propagator(dt).solve(rhs)
+        elif len(solver.C) > solver.DENSE_EXPONENTIAL_LIMIT:
+            self.T[:] = solver.sparse_exponential_step(dt, source)
+        else:
+            phi, gamma = solver.get_propagator(dt)
+
+            source /= solver.C
+            np.dot(phi, self.T, out=flow)
+            np.dot(gamma, source, out=rhs)
+            np.add(flow, rhs, out=self.T)
+
+        return self.T
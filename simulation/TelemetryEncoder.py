@@ -0,0 +1,95 @@
+﻿import json
+import struct
+from datetime import datetime
+
+import numpy as np
+
+
+class TelemetryEncoder:
+    MAGIC = b"HSTF"
+    VERSION = 1
+    FLAG_DELTA = 0x01
+    HEADER = struct.Struct("<4sBBHIqf6fI")
+    WEATHER_KEYS = ("temperature", "wind_speed", "wind_direction", "sun_radiation", "sun_altitude", "sun_azimuth")
+
+    def __init__(self, room_ids, delta_threshold=None, keyframe_interval=100):
+        self.room_ids = list(room_ids)
+        self.delta_threshold = delta_threshold
+        self.keyframe_interval = keyframe_interval
+
+        self.sequence = 0
+        self.last_sent = None
+
+    def schema_message(self):
+        return json.dumps({
+            "Type": "SimulationSchema",
+            "Version": self.VERSION,
+            "Rooms": self.room_ids,
+            "Weather": list(self.WEATHER_KEYS),
+            "Encoding": "float32",
+            "DeltaThreshold": self.delta_threshold
+        })
+
+    def encode(self, result, speed_factor):
+        temperatures = np.asarray(result["room_temps"], dtype=np.float32)
+        weather = result["weather"]
+
+        if self._is_keyframe():
+            flags = 0
+            payload = temperatures.tobytes()
+            count = len(temperatures)
+
+            self.last_sent = temperatures.copy()
+        else:
+            flags = self.FLAG_DELTA
+            changed = np.flatnonzero(np.abs(temperatures - self.last_sent) > self.delta_threshold).astype(np.uint32)
+            payload = changed.tobytes() + temperatures[changed].tobytes()
+            count = len(changed)
+
+            self.last_sent[changed] = temperatures[changed]
+
+        header = self.HEADER.pack(
+            self.MAGIC, self.VERSION, flags, 0, self.sequence & 0xFFFFFFFF,
+            int(datetime.fromisoformat(result["timestamp"]).timestamp() * 1000), speed_factor,
+            *(weather[key] for key in self.WEATHER_KEYS), count
+        )
+
+        self.sequence += 1
+
+        return header + payload
+
+    def _is_keyframe(self):
+        return (self.delta_threshold is None or self.last_sent is None or
+                self.sequence % self.keyframe_interval == 0)
+
+
+class TelemetryDecoder:
+    def __init__(self, schema_message):
+        schema = json.loads(schema_message)
+
+        self.room_ids = schema["Rooms"]
+        self.weather_keys = schema["Weather"]
+        self.temperatures = np.full(len(self.room_ids), np.nan, dtype=np.float32)
+
+    def decode(self, frame):
+        header = TelemetryEncoder.HEADER
+        magic, version, flags, _, sequence, timestamp_ms, speed_factor, *values = header.unpack_from(frame)
+        weather, count = values[:-1], values[-1]
+
+        if magic != TelemetryEncoder.MAGIC or version != TelemetryEncoder.VERSION:
+            raise ValueError("Unsupported telemetry frame.")
+
+        if flags & TelemetryEncoder.FLAG_DELTA:
+            indices = np.frombuffer(frame, dtype=np.uint32, count=count, offset=header.size)
+            values = np.frombuffer(frame, dtype=np.float32, count=count, offset=header.size + 4 * count)
+            self.temperatures[indices] = values
+        else:
+            self.temperatures[:] = np.frombuffer(frame, dtype=np.float32, count=count, offset=header.size)
+
+        return {
+            "sequence": sequence,
+            "timestamp_ms": timestamp_ms,
+            "speed_factor": speed_factor,
+            "weather": dict(zip(self.weather_keys, weather)),
+            "room_temps": self.temperatures.copy()
+        }
@@ -1,25 +1,134 @@
 ﻿import numpy as np
+from scipy import sparse
+from scipy.linalg import expm
+from scipy.sparse.linalg import expm_multiply, splu
 
 
 class ThermalSolver:
-    def __init__(self, G, C, G_ext_air, G_ext_ground, T_ground):
-        self.G = G
+    METHODS = ("euler", "backward_euler", "crank_nicolson", "exponential")
+    # The dense exponential propagator is N x N, larger networks apply the sparse generator with expm_multiply.
+    DENSE_EXPONENTIAL_LIMIT = 1000
+
+    def __init__(self, G, C, G_ext_air, G_ext_ground, T_ground, method="euler", members=None):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown integration method: {method}.")
+
+        self.G = sparse.csr_matrix(G)
         self.C = C
         self.G_ext_air = G_ext_air
         self.G_ext_ground = G_ext_ground
         self.T_ground = T_ground
+        self.method = method
+        self.members = members
 
-        self.T = np.full(len(C), 21.0)
+        self._propagators = {}
+        self._build_network()
+
+        self.T = np.full(len(C) if members is None else (len(C), members), 21.0)
 
     def step(self, dt, T_outside, Q_extra):
-        Q_inter = np.dot(self.G, self.T) - (np.sum(self.G, axis=1) * self.T)
+        Q_source = self._G_ext_air * T_outside + self._Q_ground + Q_extra
+
+        if self.method == "euler":
+            total_Q = self.L @ self.T + Q_source
+
+            self.T += (total_Q / self._C) * dt
+        elif self.method == "backward_euler":
+            lu = self.get_propagator(dt)
+
+            self.T[:] = lu.solve(self._C / dt * self.T + Q_source)
+        elif self.method == "crank_nicolson":
+            lu = self.get_propagator(dt)
+
+            self.T[:] = lu.solve(self._C / dt * self.T + 0.5 * (self.L @ self.T) + Q_source)
+        elif len(self.C) > self.DENSE_EXPONENTIAL_LIMIT:
+            self.T[:] = self.sparse_exponential_step(dt, Q_source)
+        else:
+            phi, gamma = self.get_propagator(dt)
 
-        Q_air = self.G_ext_air * (T_outside - self.T)
+            self.T[:] = phi @ self.T + gamma @ (Q_source / self._C)
 
-        Q_ground = self.G_ext_ground * (self.T_ground - self.T)
+        return self.T
 
-        total_Q = Q_inter + Q_air + Q_ground + Q_extra
+    def steady_state(self, T_outside, Q_extra, G_extra=None):
+        # Solves 0 = L T + G_ext_air T_out + Q, with G_extra as additional per-room losses to the outside air.
+        Q_source = self.G_ext_air * T_outside + self.Q_ground + Q_extra
+        A = -self.L if G_extra is None else sparse.diags(G_extra) - self.L
 
-        self.T += (total_Q / self.C) * dt
+        T = splu(A.tocsc()).solve(Q_source)
+        self.T[:] = T if self.members is None else T[:, None]
 
         return self.T
+
+    def update(self, G=None, C=None, G_ext_air=None, G_ext_ground=None, T_ground=None):
+        # Replaces network parameters of the same nodes, the state is kept and the cached propagators are dropped.
+        if G is not None:
+            self.G = sparse.csr_matrix(G)
+        if C is not None:
+            self.C = C
+        if G_ext_air is not None:
+            self.G_ext_air = G_ext_air
+        if G_ext_ground is not None:
+            self.G_ext_ground = G_ext_ground
+        if T_ground is not None:
+            self.T_ground = T_ground
+
+        self._build_network()
+        self.invalidate()
+
+    def _build_network(self):
+        self.G_diag = np.asarray(self.G.sum(axis=1)).ravel()
+        self.L = (self.G - sparse.diags(self.G_diag + self.G_ext_air + self.G_ext_ground)).tocsr()
+        self.Q_ground = self.G_ext_ground * self.T_ground
+
+        self._shape_state_vectors()
+
+    def _shape_state_vectors(self):
+        # Ensemble state is (N x M), so per-room vectors become columns that broadcast across members.
+        column = np.s_[:] if self.members is None else np.s_[:, None]
+
+        self._C = self.C[column]
+        self._G_ext_air = self.G_ext_air[column]
+        self._Q_ground = self.Q_ground[column]
+
+    def get_propagator(self, dt):
+        if dt not in self._propagators:
+            self._propagators[dt] = self._build_propagator(dt)
+
+        return self._propagators[dt]
+
+    def _build_propagator(self, dt):
+        if self.method == "backward_euler":
+            return splu((sparse.diags(self.C / dt) - self.L).tocsc())
+
+        if self.method == "crank_nicolson":
+            return splu((sparse.diags(self.C / dt) - 0.5 * self.L).tocsc())
+
+        N = len(self.C)
+
+        if N > self.DENSE_EXPONENTIAL_LIMIT:
+            return (sparse.diags(dt / self.C) @ self.L).tocsr()
+
+        augmented = np.zeros((2 * N, 2 * N))
+        augmented[:N, :N] = (self.L.toarray() / self.C[:, None]) * dt
+        augmented[:N, N:] = np.eye(N) * dt
+
+        exponential = expm(augmented)
+
+        return exponential[:N, :N], exponential[:N, N:]
+
+    def sparse_exponential_step(self, dt, Q_source):
+        N = len(self.C)
+        source = (Q_source / self._C * dt).reshape(N, -1)
+        n_sources = source.shape[1]
+
+        # Each held source becomes an extra state with no dynamics of its own, so a single expm_multiply of the
+        # augmented generator gives the exact step from products with the sparse matrix only.
+        augmented = sparse.bmat([[self.get_propagator(dt), sparse.csr_matrix(source)],
+                                 [None, sparse.csr_matrix((n_sources, n_sources))]], format="csr")
+        start = np.vstack([self.T.reshape(N, -1), np.eye(n_sources)])
+
+        return expm_multiply(augmented, start)[:N].reshape(self.T.shape)
+
+    def invalidate(self):
+        self._propagators.clear()
@@ -2,39 +2,56 @@
 import pandas as pd
 import pvlib
 
+from WeatherStore import WeatherStore
+
 
 class WeatherService:
+    INTERPOLATED_COLUMNS = ("temperature", "wind_speed", "sun_radiation", "wind_u", "wind_v")
+
     def __init__(self, weather_path, timezone_str, latitude, longitude):
-        df = pd.read_csv(weather_path)
         self.latitude = latitude
         self.longitude = longitude
 
+        if weather_path.endswith(WeatherStore.EXTENSION):
+            self._load_store(weather_path, timezone_str)
+        else:
+            self._load_csv(weather_path, timezone_str)
+
+        self.table = None
+        self.table_start = None
+        self.table_dt = None
+        self.table_length = 0
+
+    def _load_csv(self, weather_path, timezone_str):
+        df = pd.read_csv(weather_path)
+
         df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True).dt.tz_convert(timezone_str)
 
         rad = np.radians(df["wind_direction"])
         df["wind_u"] = np.sin(rad)
         df["wind_v"] = np.cos(rad)
 
-        self.weather_history = df.set_index("timestamp").sort_index()
+        weather_history = df.set_index("timestamp").sort_index()
+        self.timezone = weather_history.index.tz
 
-    def get_weather(self, current_time):
-        now = pd.Timestamp(current_time)
-        now = now.tz_convert(self.weather_history.index.tz)
+        self.epoch_seconds = weather_history.index.as_unit("s").asi8.astype(np.float64)
+        self.columns = {
+            name: weather_history[name].to_numpy(dtype=np.float64) for name in self.INTERPOLATED_COLUMNS
+        }
 
-        idx_after = self.weather_history.index.searchsorted(now)
+    def _load_store(self, weather_path, timezone_str):
+        store = WeatherStore(weather_path)
+        self.timezone = pd.Timestamp(0, tz=timezone_str).tz
 
-        # TODO: fix this
-        ####################################
-        t1, t2 = self.weather_history.index[idx_after - 1], self.weather_history.index[idx_after]
-        weight2 = (now - t1).total_seconds() / (t2 - t1).total_seconds()
-        weight1 = 1 - weight2
+        self.epoch_seconds = store["timestamp"]
+        self.columns = {name: store[name] for name in self.INTERPOLATED_COLUMNS}
 
-        interp_row = (self.weather_history.loc[t1] * weight1) + (self.weather_history.loc[t2] * weight2)
-        raw_weather = interp_row.to_dict()
-        ####################################
+    def get_weather(self, current_time):
+        now = pd.Timestamp(current_time)
+        now = now.tz_convert(self.timezone)
 
-        wind_dir_rad = np.arctan2(raw_weather["wind_u"], raw_weather["wind_v"])
-        raw_weather["wind_direction"] = (np.degrees(wind_dir_rad) + 360) % 360
+        interpolated = self._interpolate(np.array([now.timestamp()]))
+        raw_weather = {name: float(values[0]) for name, values in interpolated.items()}
 
         solar_pos = pvlib.solarposition.get_solarposition(
             time=pd.DatetimeIndex([now]),
@@ -46,3 +63,84 @@ class WeatherService:
         raw_weather["sun_azimuth"] = solar_pos["azimuth"].iloc[0]
 
         return raw_weather
+
+    def precompute(self, start, end, dt_seconds):
+        times = pd.date_range(pd.Timestamp(start).tz_convert(self.timezone), pd.Timestamp(end),
+                              freq=pd.Timedelta(seconds=dt_seconds), inclusive="left")
+
+        self.table = self._weather_for_times(times)
+        self.table_start = times[0]
+        self.table_dt = dt_seconds
+        self.table_length = len(times)
+
+        return self.table
+
+    def get_forecast(self, start, horizon, dt_seconds, error_std=None, rng=None):
+        start = pd.Timestamp(start).tz_convert(self.timezone)
+        step_index = self.index_of(start) if dt_seconds == self.table_dt else None
+
+        if step_index is not None and step_index + horizon <= self.table_length:
+            forecast = {name: values[step_index:step_index + horizon].copy() for name, values in self.table.items()}
+        else:
+            times = pd.date_range(start, periods=horizon, freq=pd.Timedelta(seconds=dt_seconds))
+            forecast = self._weather_for_times(times)
+
+        if error_std:
+            self._apply_forecast_error(forecast, error_std, dt_seconds, rng)
+
+        return forecast
+
+    def _apply_forecast_error(self, forecast, error_std, dt_seconds, rng):
+        rng = rng if rng is not None else np.random.default_rng()
+        horizon = len(forecast["temperature"])
+
+        # Errors are random walks over lead time, so their variance grows linearly with the horizon.
+        for name, std_per_sqrt_hour in error_std.items():
+            steps = rng.normal(0.0, std_per_sqrt_hour * np.sqrt(dt_seconds / 3600.0), horizon)
+            error = np.cumsum(steps)
+
+            if name == "temperature":
+                forecast[name] += error
+            elif name in ("wind_speed", "sun_radiation"):
+                forecast[name] = np.maximum(forecast[name] * (1.0 + error), 0.0)
+            else:
+                raise KeyError(f"No forecast error model for {name}.")
+
+    def _weather_for_times(self, times):
+        weather = self._interpolate(times.as_unit("s").asi8.astype(np.float64))
+
+        solar_pos = pvlib.solarposition.get_solarposition(
+            time=times,
+            latitude=self.latitude,
+            longitude=self.longitude
+        )
+
+        weather["sun_altitude"] = solar_pos["apparent_elevation"].to_numpy(dtype=np.float64)
+        weather["sun_azimuth"] = solar_pos["azimuth"].to_numpy(dtype=np.float64)
+
+        return {name: np.ascontiguousarray(values) for name, values in weather.items()}
+
+    def get_weather_at(self, step_index):
+        return {name: float(values[step_index]) for name, values in self.table.items()}
+
+    def index_of(self, current_time):
+        if self.table is None:
+            return None
+
+        offset = (pd.Timestamp(current_time) - self.table_start).total_seconds()
+        step_index, remainder = divmod(offset, self.table_dt)
+
+        if remainder != 0 or not 0 <= step_index < self.table_length:
+            return None
+
+        return int(step_index)
+
+    def _interpolate(self, epoch_seconds):
+        interpolated = {
+            name: np.interp(epoch_seconds, self.epoch_seconds, values) for name, values in self.columns.items()
+        }
+
+        wind_dir_rad = np.arctan2(interpolated["wind_u"], interpolated["wind_v"])
+        interpolated["wind_direction"] = (np.degrees(wind_dir_rad) + 360) % 360
+
+        return interpolated
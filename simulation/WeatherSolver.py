@@ -1,54 +1,135 @@
-﻿import math
-
-import numpy as np
+﻿import numpy as np
+from scipy import sparse
 
 
 class WeatherSolver:
     RHO_CP_AIR = 1200
     H_EXTERNAL = 25.0
+    FLAT_TILT = 10
 
     def __init__(self, external_connections, standards, N):
-        self.connections = external_connections
         self.standards = standards
         self.N = N
 
+        if isinstance(external_connections, dict):
+            self.connections = external_connections
+        else:
+            self.connections = self.compile_connections(external_connections)
+
+        self.room_idx = self.connections["room_idx"]
+        self.surface_idx = self.connections["surface_idx"]
+
+        # Windows heat the room directly, opaque walls heat their outer surface node (the room for a lumped wall).
+        self.solar_coef = np.concatenate([self.connections["window_shgc_area"],
+                                          self.connections["wall_net_area"] * self.connections["absorptance_u_h"]])
+        self.solar_idx = np.concatenate([self.room_idx, self.surface_idx])
+        self.wind_coef = self.connections["ach_volume"] * self.RHO_CP_AIR / 3600
+
+        n_connections = len(self.room_idx)
+
+        # A district has a handful of distinct facade orientations, so incidence and wind exposure are evaluated once
+        # per orientation and each room weighs them by the coefficients of its facades facing that way.
+        orientations, orientation_idx = np.unique(np.column_stack([self.connections["azimuth"],
+                                                                   self.connections["tilt"]]), axis=0,
+                                                  return_inverse=True)
+        self.orientation_idx = orientation_idx.ravel()
+        self.n_orientations = len(orientations)
+
+        self.orientation_azimuth = np.radians(orientations[:, 0])
+        self.orientation_sin_tilt = np.sin(np.radians(orientations[:, 1]))
+        self.orientation_cos_tilt = np.cos(np.radians(orientations[:, 1]))
+        self.orientation_is_flat = orientations[:, 1] < self.FLAT_TILT
+
+        # Wind and solar weights share one sparsity pattern, so a node's orientations are visited once for both.
+        rows = np.concatenate([self.room_idx, self.solar_idx])
+        columns = np.tile(self.orientation_idx, 3)
+        keys, entry = np.unique(rows * self.n_orientations + columns, return_inverse=True)
+
+        indptr = np.searchsorted(keys // self.n_orientations, np.arange(N + 1))
+        indices = keys % self.n_orientations
+        wind_data = np.bincount(entry, weights=np.concatenate([self.wind_coef, np.zeros(2 * n_connections)]),
+                                minlength=len(keys))
+        solar_data = np.bincount(entry, weights=np.concatenate([np.zeros(n_connections), self.solar_coef]),
+                                 minlength=len(keys))
+
+        self.wind_weights = sparse.csr_matrix((wind_data, indices, indptr), shape=(N, self.n_orientations))
+        self.solar_weights = sparse.csr_matrix((solar_data, indices, indptr), shape=(N, self.n_orientations))
+
+    @classmethod
+    def compile_connections(cls, external_connections):
+        n = len(external_connections)
+
+        compiled = {
+            "room_idx": np.zeros(n, dtype=np.int64),
+            "surface_idx": np.zeros(n, dtype=np.int64),
+            "azimuth": np.zeros(n),
+            "tilt": np.zeros(n),
+            "wall_net_area": np.zeros(n),
+            "window_shgc_area": np.zeros(n),
+            "absorptance_u_h": np.zeros(n),
+            "ach_volume": np.zeros(n)
+        }
+
+        for i, connection in enumerate(external_connections):
+            windows = connection["windows"]
+
+            compiled["room_idx"][i] = connection["room_idx"]
+            compiled["surface_idx"][i] = connection["surface_idx"]
+            compiled["azimuth"][i] = connection["azimuth"]
+            compiled["tilt"][i] = connection["tilt"]
+            compiled["wall_net_area"][i] = connection["area_gross"] - sum(window["area"] for window in windows)
+            compiled["window_shgc_area"][i] = sum(window["area"] * window["shgc"] for window in windows)
+            compiled["absorptance_u_h"][i] = connection["absorptance"] * connection["u_value"] / cls.H_EXTERNAL
+            compiled["ach_volume"][i] = connection["ach_wind_coef"] * connection["volume"]
+
+        return compiled
+
     def calculate_environmental_gains(self, sun_rad, sun_altitude, sun_azimuth, wind_speed, wind_direction,
-                                      temperature_ext, temperature_rooms):
-        q_net = np.zeros(self.N)
+                                      temperature_ext, temperature_rooms, incidence=None, exposure=None):
+        # incidence and exposure are this step's rows of precomputed orientation tables, evaluated here otherwise.
+        if incidence is None:
+            incidence = self.solar_incidence(sun_altitude, sun_azimuth)
+        if exposure is None:
+            exposure = self.wind_exposure(wind_direction)
+
+        if np.ndim(temperature_rooms) == 2:
+            return self._calculate_ensemble_gains(sun_rad, wind_speed, temperature_ext, temperature_rooms, incidence,
+                                                  exposure)
+
+        gains = (self.wind_weights @ exposure) * wind_speed * (temperature_ext - temperature_rooms)
+        gains += (self.solar_weights @ incidence) * sun_rad
 
-        if sun_altitude > 0:
-            for connection in self.connections:
-                azimuth_diff = math.radians(sun_azimuth - connection["azimuth"])
-                el_rad = math.radians(sun_altitude)
-                tilt_rad = math.radians(connection["tilt"])
+        return gains
 
-                cos_theta = (math.sin(el_rad) * math.cos(tilt_rad) +
-                             math.cos(el_rad) * math.sin(tilt_rad) * math.cos(azimuth_diff))
+    def solar_incidence(self, sun_altitude, sun_azimuth):
+        # cos of the incidence angle per orientation, for one sun position or a (steps, orientations) table.
+        el_rad = np.radians(np.asarray(sun_altitude, dtype=np.float64))[..., None]
+        sun_azimuth_rad = np.radians(np.asarray(sun_azimuth, dtype=np.float64))[..., None]
 
-                if cos_theta > 0:
-                    room_idx = connection["room_idx"]
-                    win_area_sum = 0
+        cos_theta = (np.sin(el_rad) * self.orientation_cos_tilt +
+                     np.cos(el_rad) * self.orientation_sin_tilt * np.cos(sun_azimuth_rad - self.orientation_azimuth))
 
-                    for window in connection["windows"]:
-                        q_net[room_idx] += window["area"] * sun_rad * window["shgc"] * cos_theta
-                        win_area_sum += window["area"]
+        return np.where(el_rad > 0, np.maximum(cos_theta, 0.0), 0.0)
 
-                    wall_net_area = connection["area_gross"] - win_area_sum
+    def wind_exposure(self, wind_direction):
+        wind_direction_rad = np.radians(np.asarray(wind_direction, dtype=np.float64))[..., None]
 
-                    q_net[room_idx] += (wall_net_area * sun_rad * connection["absorptance"] * cos_theta * (connection["u_value"] / self.H_EXTERNAL))
+        return np.where(self.orientation_is_flat, 1.0, (np.cos(wind_direction_rad - self.orientation_azimuth) + 1) / 2)
 
-        for connection in self.connections:
-            room_idx = connection["room_idx"]
+    def orientation_table(self, weather):
+        return {
+            "incidence": self.solar_incidence(weather["sun_altitude"], weather["sun_azimuth"]),
+            "exposure": self.wind_exposure(weather["wind_direction"])
+        }
 
-            if connection["tilt"] < 10:
-                exposure = 1.0
-            else:
-                wind_az_diff = math.radians(wind_direction - connection["azimuth"])
-                exposure = (math.cos(wind_az_diff) + 1) / 2
+    def infiltration_conductance(self, wind_speed, wind_direction):
+        return (self.wind_weights @ self.wind_exposure(wind_direction)) * wind_speed
 
-            n_wind = (connection["ach_wind_coef"] * wind_speed * exposure) / 3600
+    def _calculate_ensemble_gains(self, sun_rad, wind_speed, temperature_ext, temperature_rooms, incidence, exposure):
+        # Weather inputs are scalars or (M,) per-member arrays, per-member exposure is (M, orientations).
+        wind_weights = (self.wind_weights @ exposure.T).reshape(self.N, -1)
 
-            q_net[room_idx] += n_wind * connection["volume"] * self.RHO_CP_AIR * (
-                    temperature_ext - temperature_rooms[room_idx])
+        gains = wind_weights * wind_speed * (temperature_ext - temperature_rooms)
+        gains += (self.solar_weights @ incidence)[:, None] * sun_rad
 
-        return q_net
+        return gains
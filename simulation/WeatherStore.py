@@ -0,0 +1,93 @@
+﻿import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+class WeatherStore:
+    MAGIC = b"HSWEATHR"
+    VERSION = 1
+    ALIGNMENT = 64
+    EXTENSION = ".wst"
+    COLUMNS = ("temperature", "wind_speed", "wind_direction", "sun_radiation", "wind_u", "wind_v")
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic = f.read(len(self.MAGIC))
+
+            if magic != self.MAGIC:
+                raise ValueError(f"{path} is not a weather store.")
+
+            header_length = int(np.frombuffer(f.read(8), dtype="<u8")[0])
+            self.header = json.loads(f.read(header_length))
+
+        if self.header["version"] != self.VERSION:
+            raise ValueError(f"Unsupported weather store version {self.header['version']}.")
+
+        data_start = self._align(len(self.MAGIC) + 8 + header_length)
+
+        self.path = path
+        self.length = self.header["length"]
+        self.columns = {
+            column["name"]: np.memmap(path, dtype=column["dtype"], mode="r", offset=data_start + column["offset"],
+                                      shape=(self.length,))
+            for column in self.header["columns"]
+        }
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def convert_csv(cls, csv_paths, store_path, dtype="float32"):
+        if isinstance(csv_paths, str):
+            csv_paths = [csv_paths]
+
+        df = pd.concat([pd.read_csv(csv_path) for csv_path in csv_paths], ignore_index=True)
+        df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+        df = df.drop_duplicates("timestamp", keep="last").sort_values("timestamp")
+
+        rad = np.radians(df["wind_direction"])
+        df["wind_u"] = np.sin(rad)
+        df["wind_v"] = np.cos(rad)
+
+        arrays = {"timestamp": pd.DatetimeIndex(df["timestamp"]).as_unit("s").asi8.astype("<i8")}
+        arrays.update({name: df[name].to_numpy().astype(np.dtype(dtype).newbyteorder("<")) for name in cls.COLUMNS})
+
+        cls.write(store_path, arrays)
+
+    @classmethod
+    def write(cls, store_path, arrays):
+        lengths = {len(values) for values in arrays.values()}
+
+        if len(lengths) != 1:
+            raise ValueError("All weather store columns must have the same length.")
+
+        columns = []
+        offset = 0
+
+        for name, values in arrays.items():
+            columns.append({"name": name, "dtype": values.dtype.str, "offset": offset})
+            offset = cls._align(offset + values.nbytes)
+
+        header = json.dumps({"version": cls.VERSION, "length": lengths.pop(), "columns": columns}).encode()
+        data_start = cls._align(len(cls.MAGIC) + 8 + len(header))
+
+        with open(store_path, "wb") as f:
+            f.write(cls.MAGIC)
+            f.write(np.array([len(header)], dtype="<u8").tobytes())
+            f.write(header)
+
+            for column, values in zip(columns, arrays.values()):
+                f.seek(data_start + column["offset"])
+                f.write(np.ascontiguousarray(values).tobytes())
+
+            f.truncate(data_start + offset)
+
+    @classmethod
+    def _align(cls, position):
+        return -(-position // cls.ALIGNMENT) * cls.ALIGNMENT
+
+
+if __name__ == "__main__":
+    WeatherStore.convert_csv(sys.argv[1:-1], sys.argv[-1])
@@ -0,0 +1,134 @@
+﻿import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+
+from DistrictGenerator import DistrictGenerator
+from DistrictModel import DistrictModel
+from DistrictModelParser import DistrictModelParser
+from DistrictSimulation import DistrictSimulation
+from StepKernel import StepKernel
+from ThermalSolver import ThermalSolver
+from WeatherSolver import WeatherSolver
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000, 1000000)
+
+
+def time_call(function, repeat):
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        function()
+
+    return (time.perf_counter() - start) / repeat
+
+
+def repeats_for(n_rooms, budget=2_000_000):
+    return max(3, min(1000, budget // max(n_rooms, 1)))
+
+
+def benchmark_size(n_rooms, weather_path, work_dir, dt_seconds):
+    generator = DistrictGenerator.for_room_count(n_rooms)
+    config_path = os.path.join(work_dir, f"district_{n_rooms}.yaml")
+
+    start = time.perf_counter()
+    generator.write(config_path)
+    generate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parser = DistrictModelParser(config_path)
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model = DistrictModel.from_parser(parser)
+    parse_time = time.perf_counter() - start
+
+    model_path = os.path.join(work_dir, f"district_{n_rooms}.npz")
+    model.save(model_path)
+
+    start = time.perf_counter()
+    DistrictModel.load(model_path)
+    compiled_load_time = time.perf_counter() - start
+
+    repeat = repeats_for(model.N)
+    temperatures = np.full(model.N, 21.0)
+
+    thermal_solver = ThermalSolver(model.G, model.C.copy(), model.G_ext_air, model.G_ext_ground,
+                                   model.metadata["ground_temperature"])
+    q_extra = np.zeros(model.N)
+    thermal_step_time = time_call(lambda: thermal_solver.step(dt_seconds, 0.0, q_extra), repeat)
+
+    weather_solver = WeatherSolver(model.external_connections, model.standards, model.N)
+    weather_time = time_call(lambda: weather_solver.calculate_environmental_gains(
+        500.0, 30.0, 180.0, 3.0, 90.0, 0.0, temperatures), repeat)
+
+    kernel = StepKernel(thermal_solver, weather_solver)
+    kernel.step(dt_seconds, 0.0, 3.0, 90.0, 500.0, 30.0, 180.0)
+    kernel_step_time = time_call(lambda: kernel.step(dt_seconds, 0.0, 3.0, 90.0, 500.0, 30.0, 180.0), repeat)
+
+    simulation = DistrictSimulation(config_path, weather_path, dt_seconds=dt_seconds)
+    run_step_time = time_call(lambda: simulation.run_step(dt_seconds), repeat)
+    run_time = time_call(lambda: simulation.run(repeat, dt_seconds), 1) / repeat
+
+    return {
+        "rooms": model.N,
+        "buildings": generator.n_buildings,
+        "external_connections": len(model.external_connections["room_idx"]),
+        "conductance_nnz": int(model.G.nnz),
+        "repeat": repeat,
+        "generate_s": generate_time,
+        "yaml_load_s": load_time,
+        "parse_s": parse_time,
+        "compiled_model_bytes": os.path.getsize(model_path),
+        "compiled_model_load_s": compiled_load_time,
+        "thermal_step_s": thermal_step_time,
+        "weather_gains_s": weather_time,
+        "kernel_backend": kernel.backend,
+        "kernel_step_s": kernel_step_time,
+        "run_step_s": run_step_time,
+        "run_step_per_s": 1 / run_step_time,
+        "run_per_step_s": run_time,
+        "run_steps_per_s": 1 / run_time
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark the district simulation hot path.")
+    arg_parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES))
+    arg_parser.add_argument("--weather", default="weather_history.csv")
+    arg_parser.add_argument("--dt", type=float, default=900.0)
+    arg_parser.add_argument("--output", default=os.path.join(".cache", "benchmark_results.json"))
+    args = arg_parser.parse_args()
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "dt_seconds": args.dt,
+        "results": []
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in (int(size) for size in args.sizes.split(",")):
+            result = benchmark_size(size, args.weather, work_dir, args.dt)
+            results["results"].append(result)
+
+            print(f"{result['rooms']:>8} rooms: parse {result['parse_s']:.3f} s, "
+                  f"thermal step {result['thermal_step_s'] * 1e6:.1f} us, "
+                  f"weather gains {result['weather_gains_s'] * 1e6:.1f} us, "
+                  f"{result['kernel_backend']} kernel step {result['kernel_step_s'] * 1e6:.1f} us, "
+                  f"run_step {result['run_step_per_s']:.0f} steps/s, run {result['run_steps_per_s']:.0f} steps/s")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
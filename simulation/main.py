@@ -1,3 +1,12 @@
-﻿from DistrictSimulation import DistrictSimulation
+﻿import asyncio
 
-simulation = DistrictSimulation("district_config.yaml", "weather_history.csv")
+from DistrictSimulation import DistrictSimulation
+from RealtimeRunner import RealtimeRunner
+
+DT = 3600.0
+
+simulation = DistrictSimulation("district_config.yaml", "weather_history.csv", dt_seconds=DT, model_cache_dir=".cache")
+
+runner = RealtimeRunner(simulation, url="ws://localhost:6101/ws", dt_seconds=DT, speed_factor=1000.0)
+
+asyncio.run(runner.run())
@@ -0,0 +1,28 @@
+﻿import os
+import sys
+
+import pytest
+
+SIMULATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, SIMULATION_DIR)
+
+CONFIG_PATH = os.path.join(SIMULATION_DIR, "district_config.yaml")
+WEATHER_PATH = os.path.join(SIMULATION_DIR, "weather_history.csv")
+
+
+@pytest.fixture(scope="session")
+def generated_config(tmp_path_factory):
+    from DistrictGenerator import DistrictGenerator
+
+    path = str(tmp_path_factory.mktemp("district") / "generated.yaml")
+    DistrictGenerator.for_room_count(200).write(path)
+
+    return path
+
+
+@pytest.fixture(scope="session")
+def generated_model(generated_config):
+    from DistrictModel import DistrictModel
+
+    return DistrictModel.from_yaml(generated_config)
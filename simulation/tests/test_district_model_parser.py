@@ -0,0 +1,110 @@
+﻿import os
+
+import numpy as np
+import pytest
+import yaml
+
+from conftest import SIMULATION_DIR
+from DistrictGenerator import DistrictGenerator
+from DistrictModel import DistrictModel
+
+ANCHORED_CONFIG = """
+metadata: {latitude: 52.4, longitude: 16.9, elevation: 75.0, timezone: Europe/Warsaw, ground_temperature: 8.5}
+templates:
+  apartments:
+    one_room:
+      rooms:
+        - {id: room1, name: Room, area: 20.0, volume: 60.0, heat_capacity_per_m2: room}
+buildings:
+  - id: b1
+    standards: &std
+      ach_wind_coef: 0.1
+      wall_ext: {u_value: 0.2, heat_capacity_per_m2: 40000, absorptance: 0.5}
+      window: {u_value: 0.8, shgc: 0.5}
+      room: {heat_capacity_per_m2: 10000}
+    apartments:
+      - {id: a1, template: one_room}
+    external_connections:
+      - {type: wall, from: "a1:room1", to: outside, area: 20.0, azimuth: 180, tilt: 90, thermal_code: wall_ext}
+  - id: b2
+    standards: *std
+    apartments:
+      - {id: a1, template: one_room}
+"""
+
+
+def expand_templates(raw):
+    templates = raw.pop("templates", {})
+    apartment_templates = templates.get("apartments", {})
+    building_templates = templates.get("buildings", {})
+
+    def instantiate(definition, definitions):
+        if "template" not in definition:
+            return dict(definition)
+
+        expanded = {**definitions[definition["template"]], **definition}
+        del expanded["template"]
+
+        return expanded
+
+    buildings = []
+
+    for building in raw["buildings"]:
+        building = instantiate(building, building_templates)
+        building["apartments"] = [instantiate(apartment, apartment_templates) for apartment in building["apartments"]]
+        buildings.append(building)
+
+    return {**raw, "buildings": buildings}
+
+
+def load_pair(tmp_path, raw):
+    templated_path = tmp_path / "templated.yaml"
+    explicit_path = tmp_path / "explicit.yaml"
+
+    # Dumping without aliases gives every building its own standards object in the explicit config.
+    templated_path.write_text(yaml.safe_dump(raw))
+    explicit_path.write_text(yaml.dump(expand_templates(raw), Dumper=type("NoAliases", (yaml.SafeDumper,), {
+        "ignore_aliases": lambda self, data: True
+    })))
+
+    return DistrictModel.from_yaml(str(templated_path)), DistrictModel.from_yaml(str(explicit_path))
+
+
+def assert_same_model(templated, explicit):
+    assert templated.nodes == explicit.nodes
+    assert (templated.G != explicit.G).nnz == 0
+    np.testing.assert_array_equal(templated.C, explicit.C)
+    np.testing.assert_array_equal(templated.G_ext_air, explicit.G_ext_air)
+    np.testing.assert_array_equal(templated.G_ext_ground, explicit.G_ext_ground)
+
+    for name, values in explicit.external_connections.items():
+        np.testing.assert_array_equal(templated.external_connections[name], values)
+
+
+def test_district_config_templates_match_explicit_assembly(tmp_path):
+    with open(os.path.join(SIMULATION_DIR, "district_config.yaml")) as f:
+        raw = yaml.safe_load(f)
+
+    assert_same_model(*load_pair(tmp_path, raw))
+
+
+@pytest.mark.parametrize("mass_nodes", [0, 2])
+def test_generated_templates_match_explicit_assembly(tmp_path, mass_nodes):
+    raw = DistrictGenerator.for_room_count(200).generate()
+
+    if mass_nodes:
+        for template in raw["templates"]["buildings"].values():
+            template["standards"]["wall_ext"]["mass_nodes"] = mass_nodes
+
+    assert_same_model(*load_pair(tmp_path, raw))
+
+
+def test_shared_standards_anchor_does_not_copy_building_connections(tmp_path):
+    raw = yaml.safe_load(ANCHORED_CONFIG)
+    templated, explicit = load_pair(tmp_path, raw)
+
+    assert_same_model(templated, explicit)
+
+    room = templated.nodes["b2:a1:room1"]
+    assert templated.C[room] == pytest.approx(20.0 * 10000 + 60.0 * 1200)
+    assert templated.G_ext_air[room] == 0.0
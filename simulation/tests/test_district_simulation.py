@@ -0,0 +1,90 @@
+﻿from datetime import timedelta
+
+import numpy as np
+import pytest
+import yaml
+
+from conftest import CONFIG_PATH, WEATHER_PATH
+from DistrictSimulation import DistrictSimulation
+
+DT = 3600
+
+
+def straight_run(n_steps, **kwargs):
+    simulation = DistrictSimulation(CONFIG_PATH, WEATHER_PATH, dt_seconds=DT, **kwargs)
+    states = [simulation.thermal_solver.T.copy()]
+
+    for _ in range(n_steps):
+        simulation.run_step(DT)
+        states.append(simulation.thermal_solver.T.copy())
+
+    return simulation, states
+
+
+def test_seek_forward_matches_straight_run():
+    simulation, states = straight_run(100)
+    target = simulation.current_time
+
+    seeker = DistrictSimulation(CONFIG_PATH, WEATHER_PATH, dt_seconds=DT)
+    seeker.seek(target, DT)
+
+    assert seeker.current_time == target
+    np.testing.assert_allclose(seeker.thermal_solver.T, states[100], rtol=0, atol=1e-9)
+
+
+def test_seek_accepts_naive_local_time():
+    simulation, states = straight_run(30)
+
+    seeker = DistrictSimulation(CONFIG_PATH, WEATHER_PATH, dt_seconds=DT)
+    seeker.seek(simulation.current_time.tz_localize(None), DT)
+
+    assert seeker.current_time == simulation.current_time
+    np.testing.assert_allclose(seeker.thermal_solver.T, states[30], rtol=0, atol=1e-9)
+
+
+def test_seek_back_restores_checkpoint_and_fast_forwards():
+    simulation, states = straight_run(100, checkpoint_interval=24)
+
+    simulation.seek(simulation.start_time + timedelta(seconds=50 * DT), DT)
+
+    assert simulation.step_index == 50
+    np.testing.assert_allclose(simulation.thermal_solver.T, states[50], rtol=0, atol=1e-9)
+
+
+def test_seek_resumes_from_checkpoint_files(tmp_path):
+    _, states = straight_run(100, checkpoint_interval=24, checkpoint_dir=str(tmp_path))
+
+    resumed = DistrictSimulation(CONFIG_PATH, WEATHER_PATH, dt_seconds=DT, checkpoint_dir=str(tmp_path))
+    resumed.seek(resumed.start_time + timedelta(seconds=75 * DT), DT)
+
+    assert len(resumed.checkpoints) == 4
+    np.testing.assert_allclose(resumed.thermal_solver.T, states[75], rtol=0, atol=1e-9)
+
+
+def test_seek_skips_checkpoint_files_of_another_node_layout(tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    simulation, _ = straight_run(100, checkpoint_interval=24, checkpoint_dir=checkpoint_dir)
+
+    with open(CONFIG_PATH) as f:
+        raw = yaml.safe_load(f)
+
+    raw["buildings"][0]["apartments"].append({"id": "apt8", "template": "two_room"})
+    config_path = tmp_path / "extended.yaml"
+    config_path.write_text(yaml.safe_dump(raw))
+
+    assert simulation.reload_config(str(config_path))["nodes"]
+
+    extended = DistrictSimulation(str(config_path), WEATHER_PATH, dt_seconds=DT)
+    target = extended.start_time + timedelta(seconds=75 * DT)
+    extended.seek(target, DT)
+
+    resumed = DistrictSimulation(str(config_path), WEATHER_PATH, dt_seconds=DT, checkpoint_dir=checkpoint_dir)
+    assert len(resumed.checkpoints) == 4
+
+    with pytest.raises(ValueError, match="node layout"):
+        resumed.restore(resumed.checkpoints[min(resumed.checkpoints)])
+
+    resumed.seek(target, DT)
+
+    assert all(time_ns > target.value for time_ns in resumed.checkpoints)
+    np.testing.assert_allclose(resumed.thermal_solver.T, extended.thermal_solver.T, rtol=0, atol=1e-9)
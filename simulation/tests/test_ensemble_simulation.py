@@ -0,0 +1,45 @@
+﻿from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from conftest import CONFIG_PATH, WEATHER_PATH
+from DistrictSimulation import DistrictSimulation
+from EnsembleSimulation import EnsembleSimulation
+
+DT = 3600
+
+
+def test_noiseless_ensemble_follows_simulation():
+    simulation = DistrictSimulation(CONFIG_PATH, WEATHER_PATH, dt_seconds=DT)
+    ensemble = EnsembleSimulation(simulation, 4, temperature_std=0.0, wind_speed_rel_std=0.0,
+                                  sun_radiation_rel_std=0.0, initial_std=0.0, process_noise_std=0.0, seed=0)
+
+    result = ensemble.run(48, DT)
+    expected = simulation.run(48, DT)
+
+    assert ensemble.current_time == simulation.current_time
+    np.testing.assert_allclose(result["mean"].to_numpy(), expected["room_temps"].to_numpy(), rtol=0, atol=1e-9)
+    for values in result["percentiles"].values():
+        np.testing.assert_allclose(values.to_numpy(), expected["room_temps"].to_numpy(), rtol=0, atol=1e-9)
+
+
+def test_ensemble_spread_is_ordered_and_reproducible():
+    simulation = DistrictSimulation(CONFIG_PATH, WEATHER_PATH, dt_seconds=DT)
+
+    first = EnsembleSimulation(simulation, 64, seed=3).run(24, DT)
+    second = EnsembleSimulation(simulation, 64, seed=3).run(24, DT)
+
+    low, median, high = (first["percentiles"][percentile].to_numpy() for percentile in (5, 50, 95))
+    assert np.all(low <= median) and np.all(median <= high)
+    assert np.all(high[-1] - low[-1] > 0.0)
+    np.testing.assert_array_equal(first["mean"].to_numpy(), second["mean"].to_numpy())
+
+
+def test_ensemble_rejects_unaligned_time():
+    simulation = DistrictSimulation(CONFIG_PATH, WEATHER_PATH, dt_seconds=DT)
+    ensemble = EnsembleSimulation(simulation, 2, seed=0)
+    ensemble.current_time += timedelta(minutes=10)
+
+    with pytest.raises(ValueError):
+        ensemble.run(4, DT)
@@ -0,0 +1,95 @@
+﻿import numpy as np
+import pytest
+import yaml
+
+from DistrictGenerator import DistrictGenerator
+from DistrictModel import DistrictModel
+from HeatPumpController import HeatPumpController
+from HvacSystem import HvacSystem
+from ThermalSolver import ThermalSolver
+
+H = 6
+
+
+@pytest.fixture(scope="module")
+def controller(generated_model):
+    return HeatPumpController(generated_model, HvacSystem.from_model(generated_model), horizon_steps=H, seed=0)
+
+
+def make_forecast(rng):
+    return {
+        "temperature": rng.uniform(-5.0, 5.0, H),
+        "wind_speed": rng.uniform(0.0, 8.0, H),
+        "wind_direction": rng.uniform(0.0, 360.0, H),
+        "sun_radiation": rng.uniform(0.0, 300.0, H),
+        "sun_altitude": rng.uniform(0.0, 40.0, H),
+        "sun_azimuth": rng.uniform(90.0, 270.0, H)
+    }
+
+
+def test_heating_response_matches_stepping_the_model(generated_model, controller):
+    rng = np.random.default_rng(0)
+    plans = rng.uniform(0.0, 3000.0, (3, H, controller.n_units))
+
+    response = controller.heating_response(plans)
+
+    for plan, expected in zip(plans, response):
+        solver = ThermalSolver(generated_model.G, generated_model.C, generated_model.G_ext_air,
+                               generated_model.G_ext_ground, 0.0, method="backward_euler")
+        solver.T[:] = 0.0
+
+        for k in range(H):
+            solver.step(controller.dt_seconds, 0.0, controller.distribution @ plan[k])
+            np.testing.assert_allclose(solver.T[:controller.n_rooms], expected[k], rtol=1e-9, atol=1e-12)
+
+
+def test_expired_budget_evaluates_only_the_first_batch(controller):
+    rng = np.random.default_rng(1)
+    controller.time_budget_s = 0.0
+
+    result = controller.calculate_optimal_actions(rng.uniform(17.0, 22.0, controller.N), make_forecast(rng))
+
+    assert result["evaluated_plans"] == len(controller.POWER_LEVELS)
+    assert result["plan"].shape == (H, controller.n_units)
+    assert result["predicted_temps"].shape == (H, controller.n_rooms)
+    assert result["room_heat"].shape == (controller.n_rooms,)
+
+
+def test_energy_cost_uses_the_part_load_cop_of_the_hvac_layer(generated_model, controller):
+    hvac = HvacSystem.from_model(generated_model)
+    outside = np.linspace(-10.0, 8.0, H)
+
+    # Every room below its setpoint, so each unit runs at its emitter power or its capacity.
+    unit_demand = np.bincount(hvac.unit_of_room, weights=hvac.emitter_power_w, minlength=hvac.n_units)
+    capacity = np.interp(outside, hvac.HEATING_POWER_CURVE_TEMPS, hvac.HEATING_POWER_CURVE_WATTS)[:, None] * \
+        hvac.capacity_scale[None, :]
+    plan = np.minimum(unit_demand[None, :], capacity)
+
+    expected_wh = 0.0
+    for k in range(H):
+        hvac.step(np.full(hvac.N, 10.0), outside[k], controller.dt_seconds)
+        expected_wh += hvac.electrical_power_w.sum() * controller.dt_seconds / 3600.0
+
+    # Warm free temperatures leave no comfort deficit, the cost is the energy alone.
+    free = np.full((H, controller.n_rooms), 30.0)
+    cost = controller.evaluate(plan[None], free, outside, capacity)[0]
+
+    assert cost == pytest.approx(expected_wh, rel=1e-12)
+
+
+def test_room_heat_leaves_out_envelope_nodes(tmp_path):
+    raw = DistrictGenerator.for_room_count(40).generate()
+    for template in raw["templates"]["buildings"].values():
+        template["standards"]["wall_ext"]["mass_nodes"] = 2
+
+    path = tmp_path / "mass_nodes.yaml"
+    path.write_text(yaml.safe_dump(raw))
+    model = DistrictModel.from_yaml(str(path))
+
+    controller = HeatPumpController(model, HvacSystem.from_model(model), horizon_steps=H, time_budget_s=0.0)
+    rng = np.random.default_rng(2)
+    result = controller.calculate_optimal_actions(rng.uniform(17.0, 22.0, model.N), make_forecast(rng))
+
+    assert model.N > model.n_rooms
+    assert result["room_heat"].shape == (model.n_rooms,)
+    assert result["room_heat"].sum() == pytest.approx(result["plan"][0].sum())
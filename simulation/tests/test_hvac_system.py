@@ -0,0 +1,75 @@
+﻿import numpy as np
+import pytest
+
+from HvacSystem import HvacSystem
+
+
+def make_hvac(**kwargs):
+    # Two units: rooms 0-2 share one heat pump, room 3 has its own.
+    return HvacSystem([0, 0, 0, 1], ["A", "B"], 1000.0, setpoint=20.0, hysteresis=2.0, **kwargs)
+
+
+def test_thermostat_hysteresis():
+    hvac = make_hvac()
+
+    q = hvac.step(np.array([18.5, 19.5, 21.5, 20.0]), 0.0, 3600.0)
+    np.testing.assert_array_equal(hvac.heating, [True, False, False, False])
+    np.testing.assert_allclose(q, [1000.0, 0.0, 0.0, 0.0])
+
+    # Inside the band a heating room keeps heating and an idle room stays idle.
+    hvac.step(np.array([20.5, 19.5, 21.5, 20.0]), 0.0, 3600.0)
+    np.testing.assert_array_equal(hvac.heating, [True, False, False, False])
+
+    hvac.step(np.array([21.5, 19.5, 21.5, 20.0]), 0.0, 3600.0)
+    assert not hvac.heating.any()
+
+
+def test_unit_capacity_is_shared_and_efficiency_is_load_dependent():
+    hvac = HvacSystem(np.zeros(10, dtype=np.int64), ["A"], 1000.0)
+
+    q = hvac.step(np.full(10, 15.0), -15.0, 1800.0)
+    capacity = HvacSystem.HEATING_POWER_CURVE_WATTS[0]
+
+    np.testing.assert_allclose(q, capacity / 10)
+    np.testing.assert_allclose(hvac.thermal_power_w, [capacity])
+
+    load_factor = 1.0 - HvacSystem.LOAD_PENALTY_FACTOR * (1.0 - HvacSystem.OPTIMAL_LOAD_PERCENT) ** 2
+    cop = HvacSystem.HEATING_COP_CURVE_VALUES[0] * load_factor
+    np.testing.assert_allclose(hvac.electrical_power_w, [capacity / cop])
+    np.testing.assert_allclose(hvac.electrical_energy_wh, [capacity / cop / 2])
+
+
+def test_heating_takes_priority_over_cooling_within_a_unit():
+    hvac = make_hvac(cooling_setpoint=24.0)
+
+    q = hvac.step(np.array([18.0, 26.0, 22.0, 26.0]), 28.0, 3600.0)
+
+    np.testing.assert_array_equal(hvac.heating, [True, False, False, False])
+    np.testing.assert_array_equal(hvac.cooling, [False, False, False, True])
+    assert q[0] > 0.0 and q[1] == 0.0 and q[3] < 0.0
+    assert hvac.thermal_power_w[0] > 0.0 and hvac.thermal_power_w[1] < 0.0
+
+
+def test_state_round_trip():
+    hvac = make_hvac()
+    hvac.step(np.array([18.0, 18.0, 22.0, 18.0]), 0.0, 3600.0)
+    state = hvac.get_state()
+
+    restored = make_hvac()
+    restored.set_state(state)
+    hvac.step(np.array([20.5, 21.5, 22.0, 19.0]), 0.0, 3600.0)
+    restored.step(np.array([20.5, 21.5, 22.0, 19.0]), 0.0, 3600.0)
+
+    np.testing.assert_array_equal(restored.heating, hvac.heating)
+    np.testing.assert_allclose(restored.electrical_energy_wh, hvac.electrical_energy_wh)
+
+
+@pytest.mark.parametrize("level", ["apartment", "building"])
+def test_from_model_groups_rooms_into_units(generated_model, level):
+    hvac = HvacSystem.from_model(generated_model, level)
+    room_ids = sorted(generated_model.nodes, key=generated_model.nodes.get)[:generated_model.n_rooms]
+    depth = 2 if level == "apartment" else 1
+
+    assert hvac.N == generated_model.n_rooms
+    for room_id, unit in zip(room_ids, hvac.unit_of_room):
+        assert hvac.unit_ids[unit] == ":".join(room_id.split(":")[:depth])
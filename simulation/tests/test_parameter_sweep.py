@@ -0,0 +1,72 @@
+﻿import numpy as np
+import pytest
+
+from conftest import CONFIG_PATH, WEATHER_PATH
+from DistrictModel import DistrictModel
+from DistrictModelParser import DistrictModelParser
+from ParameterSweep import ParameterSweep
+from ThermalSolver import ThermalSolver
+from WeatherSolver import WeatherSolver
+
+DT = 3600
+GRID = {"wall_ext.u_value": [0.15, 0.6], "ach_wind_coef": [0.1, 0.3]}
+
+
+@pytest.fixture(scope="module")
+def sweep_result():
+    sweep = ParameterSweep(CONFIG_PATH, WEATHER_PATH, GRID)
+
+    return sweep, sweep.run(24, DT)
+
+
+def test_sweep_table_layout(sweep_result):
+    sweep, result = sweep_result
+    n_rooms = sweep.rooms_per_variant
+
+    assert len(sweep.variants) == 4
+    assert len(result) == 4 * 24 * n_rooms
+    assert list(result.columns) == ["variant", *GRID, "timestamp", "room_id", "temperature"]
+
+    for i, variant in enumerate(sweep.variants):
+        rows = result[result["variant"] == i]
+
+        assert len(rows) == 24 * n_rooms
+        assert all((rows[parameter] == value).all() for parameter, value in variant.items())
+        assert rows["timestamp"].nunique() == 24
+
+
+def test_each_variant_matches_a_standalone_run(sweep_result):
+    sweep, result = sweep_result
+    parser = DistrictModelParser(CONFIG_PATH)
+    weather = sweep.weather_service.table
+
+    for i, variant in enumerate(sweep.variants):
+        model = DistrictModel.from_parser(parser, variant)
+        thermal_solver = ThermalSolver(model.G, model.C, model.G_ext_air, model.G_ext_ground,
+                                       sweep.metadata["ground_temperature"], method="backward_euler")
+        weather_solver = WeatherSolver(model.external_connections, model.standards, model.N)
+
+        for k in range(24):
+            q_env = weather_solver.calculate_environmental_gains(
+                weather["sun_radiation"][k], weather["sun_altitude"][k], weather["sun_azimuth"][k],
+                weather["wind_speed"][k], weather["wind_direction"][k], weather["temperature"][k], thermal_solver.T
+            )
+            thermal_solver.step(DT, weather["temperature"][k], q_env)
+
+        last = result[(result["variant"] == i) & (result["timestamp"] == result["timestamp"].max())]
+        np.testing.assert_allclose(last["temperature"].to_numpy(), thermal_solver.T[:model.n_rooms], rtol=0,
+                                   atol=1e-8)
+
+
+def test_leakier_walls_cool_faster(sweep_result):
+    sweep, result = sweep_result
+    mean = result.groupby("variant")["temperature"].mean()
+    by_variant = {tuple(variant.values()): mean[i] for i, variant in enumerate(sweep.variants)}
+
+    assert by_variant[(0.6, 0.1)] < by_variant[(0.15, 0.1)]
+    assert by_variant[(0.15, 0.3)] < by_variant[(0.15, 0.1)]
+
+
+def test_unknown_standard_is_rejected():
+    with pytest.raises(KeyError):
+        ParameterSweep(CONFIG_PATH, WEATHER_PATH, {"wall_ext.thickness": [0.2]})
@@ -0,0 +1,66 @@
+﻿import numpy as np
+import pytest
+from multiprocessing import shared_memory
+
+from PartitionedSolver import PartitionedSolver
+from ThermalSolver import ThermalSolver
+from WeatherSolver import WeatherSolver
+
+WEATHER = (-2.0, 4.0, 225.0, 350.0, 25.0, 160.0)
+
+
+class FailingPartitionSolver(PartitionedSolver):
+    @staticmethod
+    def partition(model, workers):
+        partitions = PartitionedSolver.partition(model, workers)
+
+        # A partition without any capacity or conductance makes the backward Euler system singular.
+        broken = partitions[-1]
+        broken["G"] = broken["G"] * 0.0
+        broken["C"] = np.zeros_like(broken["C"])
+        broken["G_ext_air"] = np.zeros_like(broken["G_ext_air"])
+        broken["G_ext_ground"] = np.zeros_like(broken["G_ext_ground"])
+
+        return partitions
+
+
+def test_partitioned_steps_match_serial_solver(generated_model):
+    model = generated_model
+
+    thermal_solver = ThermalSolver(model.G, model.C, model.G_ext_air, model.G_ext_ground, 8.5, method="backward_euler")
+    weather_solver = WeatherSolver(model.external_connections, model.standards, model.N)
+    partitioned_solver = PartitionedSolver(model, 8.5, "backward_euler", workers=3)
+
+    try:
+        for _ in range(24):
+            temperature, wind_speed, wind_direction, sun_radiation, sun_altitude, sun_azimuth = WEATHER
+            q_env = weather_solver.calculate_environmental_gains(sun_radiation, sun_altitude, sun_azimuth,
+                                                                 wind_speed, wind_direction, temperature,
+                                                                 thermal_solver.T)
+            thermal_solver.step(900.0, temperature, q_env)
+            partitioned_solver.step(900.0, *WEATHER)
+
+        assert len(partitioned_solver.partitions) == 3
+        np.testing.assert_allclose(partitioned_solver.T, thermal_solver.T, rtol=1e-10, atol=1e-10)
+    finally:
+        partitioned_solver.close()
+
+
+def test_failed_partition_breaks_solver(generated_model):
+    solver = FailingPartitionSolver(generated_model, 8.5, "backward_euler", workers=2, step_timeout=30.0)
+    names = [solver._T_memory.name, solver._inputs_memory.name]
+
+    with pytest.raises(RuntimeError):
+        solver.step(900.0, *WEATHER)
+
+    assert solver.broken
+    assert not any(process.is_alive() for process in solver._processes)
+
+    with pytest.raises(RuntimeError):
+        solver.step(900.0, *WEATHER)
+
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+    solver.close()
@@ -0,0 +1,135 @@
+﻿import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from conftest import CONFIG_PATH, WEATHER_PATH
+from DistrictSimulation import DistrictSimulation
+from RealtimeRunner import LoopbackConnection, RealtimeRunner
+
+DT = 3600.0
+
+
+@pytest.fixture
+def simulation():
+    return DistrictSimulation(CONFIG_PATH, WEATHER_PATH, dt_seconds=DT)
+
+
+def run_against(connection, runner, max_steps):
+    async def connect():
+        return connection
+
+    runner.connect = connect
+    asyncio.run(runner.run(max_steps))
+
+
+def test_frames_reach_loopback_connection(simulation):
+    connection = LoopbackConnection()
+    runner = RealtimeRunner(simulation, dt_seconds=DT, speed_factor=DT * 1000)
+
+    run_against(connection, runner, 10)
+
+    assert runner.steps == 10
+    assert runner.frames_sent + runner.frames_dropped == 10
+    assert connection.closed
+
+    frames = [json.loads(message) for message in connection.sent]
+    assert frames[-1]["Type"] == "SimulationData"
+    assert set(frames[-1]["Temperatures"]) == set(simulation.room_ids)
+    assert frames[-1]["SimTimestamp"] == simulation.start_time.replace(hour=9).isoformat()
+
+
+def test_speed_factor_message_is_applied_between_steps(simulation):
+    connection = LoopbackConnection()
+    connection.incoming.put_nowait(json.dumps({"Type": "Parameters", "SpeedFactor": DT * 200}))
+    runner = RealtimeRunner(simulation, dt_seconds=DT, speed_factor=DT * 1000)
+
+    run_against(connection, runner, 5)
+
+    assert runner.parameters["SpeedFactor"] == DT * 200
+    assert json.loads(connection.sent[-1])["SpeedFactor"] == DT * 200
+
+
+def test_pacing_follows_wall_clock(simulation):
+    connection = LoopbackConnection()
+    runner = RealtimeRunner(simulation, dt_seconds=DT, speed_factor=DT / 0.02)
+
+    start = time.monotonic()
+    run_against(connection, runner, 10)
+
+    # Ten steps are due at 0, 20, ..., 180 ms.
+    assert time.monotonic() - start >= 0.18
+    assert runner.resyncs == 0
+
+
+def test_slow_consumer_drops_frames_instead_of_stalling(simulation):
+    connection = LoopbackConnection(send_delay=0.05)
+    runner = RealtimeRunner(simulation, dt_seconds=DT, speed_factor=DT * 1000, queue_size=1)
+
+    run_against(connection, runner, 20)
+
+    assert runner.steps == 20
+    assert runner.frames_dropped > 0
+    assert runner.frames_sent + runner.frames_dropped == 20
+
+
+def test_manual_weather_replaces_history_while_not_auto(simulation):
+    connection = LoopbackConnection()
+    connection.incoming.put_nowait(json.dumps({
+        "Type": "SimulationParameters", "IsAuto": False, "Temp": -15.0, "WindSpeed": 12.0, "WindDir": 270.0,
+        "SunRadiation": 0.0, "SunAltitude": -10.0, "SunAzimuth": 0.0
+    }))
+    runner = RealtimeRunner(simulation, dt_seconds=DT, speed_factor=DT * 200)
+
+    run_against(connection, runner, 5)
+
+    weather = json.loads(connection.sent[-1])["Weather"]
+    assert weather["Temp"] == -15.0
+    assert weather["WindSpeed"] == 12.0
+    assert weather["WindDir"] == 270.0
+
+
+def test_unsupported_and_invalid_parameters_are_rejected(simulation, capsys):
+    runner = RealtimeRunner(simulation, dt_seconds=DT)
+
+    runner.handle_parameters(json.dumps({"SpeedFactor": -1.0, "IsAuto": "no", "Temp": "warm", "Humidity": 0.5,
+                                         "WindSpeed": 4.0}))
+
+    assert runner._pending_parameters == {"WindSpeed": 4.0}
+    assert "Unsupported parameter: Humidity." in capsys.readouterr().out
+
+
+def test_steps_run_off_the_event_loop_thread(simulation):
+    step_threads = []
+    run_step = simulation.run_step
+
+    def recording_run_step(*args):
+        step_threads.append(threading.current_thread())
+        return run_step(*args)
+
+    simulation.run_step = recording_run_step
+    runner = RealtimeRunner(simulation, dt_seconds=DT, speed_factor=DT * 1000)
+
+    run_against(LoopbackConnection(), runner, 3)
+
+    assert len(step_threads) == 3
+    assert threading.main_thread() not in step_threads
+
+
+def test_failed_step_ends_the_run(simulation):
+    connection = LoopbackConnection()
+    runner = RealtimeRunner(simulation, dt_seconds=DT, speed_factor=DT * 1000)
+
+    def failing_step(*args, **kwargs):
+        raise RuntimeError("solver failed")
+
+    simulation.kernel.step = failing_step
+
+    with pytest.raises(RuntimeError):
+        run_against(connection, runner, 5)
+
+    assert runner.steps == 0
+    assert simulation.metrics.errors == {"RuntimeError": 1}
+    assert connection.closed
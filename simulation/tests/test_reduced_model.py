@@ -0,0 +1,93 @@
+﻿import numpy as np
+import pytest
+
+from conftest import WEATHER_PATH
+from DistrictSimulation import DistrictSimulation
+from ReducedModel import ReducedModel
+from ThermalSolver import ThermalSolver
+from WeatherSolver import WeatherSolver
+
+
+def make_solver(model, method="exponential"):
+    return ThermalSolver(model.G, model.C, model.G_ext_air, model.G_ext_ground, 8.5, method=method)
+
+
+@pytest.mark.parametrize("order", [5, 40])
+@pytest.mark.parametrize("static_correction", [False, True])
+def test_error_bound_holds_against_full_model(generated_model, order, static_correction):
+    rng = np.random.default_rng(1)
+
+    full = make_solver(generated_model)
+    full.T[:] = rng.uniform(18.0, 24.0, len(full.T))
+
+    reduced_solver = make_solver(generated_model)
+    reduced_solver.T[:] = full.T
+    reduced = ReducedModel(reduced_solver, order, static_correction=static_correction)
+
+    for _ in range(72):
+        T_outside = rng.uniform(-10.0, 10.0)
+        Q_extra = rng.uniform(0.0, 800.0, len(full.T))
+
+        full.step(3600.0, T_outside, Q_extra)
+        reduced.step(3600.0, T_outside, Q_extra)
+
+        assert np.all(np.abs(full.T - reduced.T) <= reduced.error_bound() + 1e-9)
+
+
+def test_full_order_reproduces_full_model(generated_model):
+    full = make_solver(generated_model)
+    reduced = ReducedModel(make_solver(generated_model), len(full.T))
+    Q_extra = np.full(len(full.T), 300.0)
+
+    for _ in range(24):
+        full.step(3600.0, -2.0, Q_extra)
+        reduced.step(3600.0, -2.0, Q_extra)
+
+    np.testing.assert_allclose(reduced.T, full.T, rtol=0, atol=1e-8)
+    np.testing.assert_allclose(reduced.error_bound(), 0.0, atol=1e-6)
+
+
+def test_modal_weather_inputs_match_stepping_with_full_gains(generated_model):
+    rng = np.random.default_rng(2)
+    weather_solver = WeatherSolver(generated_model.external_connections, generated_model.standards,
+                                   generated_model.N)
+
+    modal = ReducedModel(make_solver(generated_model), 20, weather_solver=weather_solver)
+    full_gains = ReducedModel(make_solver(generated_model), 20)
+
+    # Stepping with full gains reads the state vector, start both from one the modes represent exactly.
+    for reduced in (modal, full_gains):
+        reduced.T[:] = modal.reconstruct()
+        reduced.project()
+
+    for _ in range(48):
+        weather = (rng.uniform(-10.0, 10.0), rng.uniform(0.0, 10.0), rng.uniform(0.0, 360.0),
+                   rng.uniform(0.0, 600.0), rng.uniform(-10.0, 50.0), rng.uniform(90.0, 270.0))
+        temperature, wind_speed, wind_direction, sun_radiation, sun_altitude, sun_azimuth = weather
+
+        modal.step_inputs(3600.0, modal.weather_inputs(*weather))
+
+        q_env = weather_solver.calculate_environmental_gains(sun_radiation, sun_altitude, sun_azimuth, wind_speed,
+                                                             wind_direction, temperature, full_gains.T)
+        full_gains.step(3600.0, temperature, q_env)
+
+        np.testing.assert_allclose(modal.reconstruct(), full_gains.T, rtol=0, atol=1e-8)
+
+    np.testing.assert_allclose(modal.error_bound(), full_gains.error_bound(), rtol=1e-6)
+    np.testing.assert_allclose(modal.sync(), full_gains.T, rtol=0, atol=1e-8)
+
+
+def test_simulation_reconstructs_reduced_state_on_demand(generated_config):
+    stepped = DistrictSimulation(generated_config, WEATHER_PATH, dt_seconds=900, reduced_order=20)
+    batched = DistrictSimulation(generated_config, WEATHER_PATH, dt_seconds=900, reduced_order=20)
+    forwarded = DistrictSimulation(generated_config, WEATHER_PATH, dt_seconds=900, reduced_order=20)
+
+    rooms = [stepped.run_step(900, compact=True)["room_temps"] for _ in range(48)]
+    result = batched.run(48, 900)
+    forwarded.fast_forward(48, 900)
+
+    np.testing.assert_allclose(result["room_temps"].to_numpy(), rooms, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(forwarded.thermal_solver.T[forwarded.rooms], rooms[-1], rtol=0, atol=1e-9)
+
+    stepped.restore(stepped.snapshot())
+    np.testing.assert_allclose(stepped.thermal_solver.T, forwarded.thermal_solver.T, rtol=0, atol=1e-9)
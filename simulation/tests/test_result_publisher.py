@@ -0,0 +1,122 @@
+﻿import importlib.util
+
+import numpy as np
+import pytest
+
+from conftest import CONFIG_PATH, WEATHER_PATH
+from DistrictSimulation import DistrictSimulation
+from ResultPublisher import LoopbackBroker, ResultPublisher
+
+DT = 3600
+
+
+@pytest.fixture(scope="module")
+def run_result():
+    simulation = DistrictSimulation(CONFIG_PATH, WEATHER_PATH, dt_seconds=DT)
+
+    return simulation.room_ids, simulation.run(50, DT)
+
+
+def test_run_is_published_in_sequenced_batches(run_result):
+    room_ids, result = run_result
+    broker = LoopbackBroker()
+    publisher = ResultPublisher(room_ids, connect=broker.connect, batch_steps=16)
+
+    publisher.publish_run(result)
+    publisher.close()
+
+    batches = broker.decoded()
+    assert [batch["Sequence"] for batch in batches] == [0, 1, 2, 3]
+    assert [len(batch["Timestamps"]) for batch in batches] == [16, 16, 16, 2]
+    assert publisher.steps_sent == 50
+
+    temperatures = np.concatenate([batch["Temperatures"] for batch in batches])
+    np.testing.assert_allclose(temperatures, result["room_temps"][list(room_ids)].to_numpy(), atol=0.005)
+
+    timestamps = sum((batch["Timestamps"] for batch in batches), [])
+    assert timestamps == [timestamp.isoformat() for timestamp in result["timestamp"]]
+
+    temperature = sum((batch["Weather"]["Temp"] for batch in batches), [])
+    np.testing.assert_allclose(temperature, result["weather"]["temperature"].to_numpy())
+
+
+def test_single_steps_are_batched(run_result):
+    room_ids, result = run_result
+    broker = LoopbackBroker()
+    publisher = ResultPublisher(room_ids, connect=broker.connect, batch_steps=8)
+
+    for k, timestamp in enumerate(result["timestamp"][:10]):
+        publisher.publish({
+            "timestamp": timestamp.isoformat(),
+            "weather": result["weather"].iloc[k].to_dict(),
+            "room_temps": result["room_temps"].iloc[k].to_dict()
+        })
+
+    publisher.close()
+
+    assert [message[2]["steps"] for message in broker.messages] == [8, 2]
+    assert broker.decoded()[1]["Timestamps"][-1] == result["timestamp"][9].isoformat()
+
+
+def test_failed_publishes_are_retried_on_a_new_connection(run_result):
+    room_ids, result = run_result
+    broker = LoopbackBroker(fail_publishes=2)
+    publisher = ResultPublisher(room_ids, connect=broker.connect, batch_steps=25, retry_delay=0.001)
+
+    publisher.publish_run(result)
+    publisher.close()
+
+    assert publisher.retries == 2
+    assert broker.connections == 3
+    assert [batch["Sequence"] for batch in broker.decoded()] == [0, 1]
+
+
+def test_drop_oldest_sheds_batches_behind_a_slow_broker(run_result):
+    room_ids, result = run_result
+    broker = LoopbackBroker(publish_delay=0.05)
+    publisher = ResultPublisher(room_ids, connect=broker.connect, batch_steps=1, buffer_size=2,
+                                overflow="drop_oldest")
+
+    publisher.publish_run(result)
+    publisher.close()
+
+    sequences = [batch["Sequence"] for batch in broker.decoded()]
+    assert publisher.batches_dropped > 0
+    assert len(sequences) + publisher.batches_dropped == 50
+    assert sequences == sorted(sequences) and sequences[-1] == 49
+
+
+def test_close_gives_up_on_a_broker_that_stays_down(run_result):
+    room_ids, result = run_result
+    broker = LoopbackBroker(fail_publishes=10 ** 9)
+    publisher = ResultPublisher(room_ids, connect=broker.connect, batch_steps=10, retry_delay=0.01, max_retries=None)
+
+    publisher.publish_run(result)
+
+    assert not publisher.flush(timeout=0.1)
+    assert not publisher.close(timeout=0.1)
+    assert not publisher._sender.is_alive()
+    assert publisher.batches_sent == 0
+    assert publisher.batches_failed + publisher.batches_dropped == 5
+
+
+def test_batches_are_dropped_after_max_retries(run_result):
+    room_ids, result = run_result
+    broker = LoopbackBroker(fail_publishes=3)
+    publisher = ResultPublisher(room_ids, connect=broker.connect, batch_steps=25, retry_delay=0.001, max_retries=2)
+
+    publisher.publish_run(result)
+
+    assert publisher.close(timeout=5.0)
+    assert publisher.batches_failed == 1
+    assert [batch["Sequence"] for batch in broker.decoded()] == [1]
+
+
+def test_missing_pika_fails_at_construction(monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name: None if name == "pika" else find_spec(name))
+
+    with pytest.raises(ImportError):
+        ResultPublisher(["B1:R1"], url="amqp://localhost")
+
+    ResultPublisher(["B1:R1"], connect=LoopbackBroker().connect).close()
@@ -0,0 +1,69 @@
+﻿import urllib.error
+import urllib.request
+
+import pytest
+
+from SimulationMetrics import SimulationMetrics
+
+
+def parse(text):
+    samples = {}
+
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+
+    return samples
+
+
+def test_render_reports_stages_and_histogram():
+    metrics = SimulationMetrics()
+    metrics.observe_step(0.0, 0.001, 0.003, 0.006, 0.007)
+    metrics.observe_batch(10, 1.0, 1.002, 1.032, 1.040, 0.010, gains_solve_seconds=0.005)
+    metrics.observe_error(ValueError("bad weather"))
+
+    samples = parse(metrics.render())
+
+    assert samples["simulation_steps_total"] == 11
+    assert samples['simulation_errors_total{type="ValueError"}'] == 1
+    assert samples['simulation_stage_seconds_total{stage="weather"}'] == pytest.approx(0.003)
+    assert samples['simulation_stage_seconds_total{stage="gains"}'] == pytest.approx(0.012)
+    assert samples['simulation_stage_seconds_total{stage="solve"}'] == pytest.approx(0.018)
+    assert samples['simulation_stage_seconds_total{stage="gains_solve"}'] == pytest.approx(0.005)
+    assert samples['simulation_stage_last_seconds{stage="serialise"}'] == pytest.approx(0.008)
+
+    # The single step took 7 ms and each batched step 4 ms.
+    assert samples['simulation_step_seconds_bucket{le="0.001"}'] == 0
+    assert samples['simulation_step_seconds_bucket{le="0.005"}'] == 10
+    assert samples['simulation_step_seconds_bucket{le="0.01"}'] == 11
+    assert samples['simulation_step_seconds_bucket{le="+Inf"}'] == 11
+    assert samples["simulation_step_seconds_count"] == 11
+    assert samples["simulation_step_seconds_sum"] == pytest.approx(0.047)
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = SimulationMetrics(enabled=False)
+    metrics.observe_step(0.0, 1.0, 2.0, 3.0, 4.0)
+    metrics.observe_batch(5, 0.0, 1.0, 2.0, 3.0, 0.5)
+
+    assert metrics.clock() == 0.0
+    assert parse(metrics.render())["simulation_steps_total"] == 0
+
+
+def test_serve_exposes_metrics_endpoint():
+    metrics = SimulationMetrics()
+    metrics.observe_step(0.0, 0.001, 0.002, 0.003, 0.004)
+    server = metrics.serve(0)
+
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert parse(response.read().decode())["simulation_steps_total"] == 1
+
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        metrics.shutdown()
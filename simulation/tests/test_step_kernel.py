@@ -0,0 +1,88 @@
+﻿import numpy as np
+import pytest
+
+import StepKernel as StepKernel_module
+from conftest import WEATHER_PATH
+from DistrictSimulation import DistrictSimulation
+from SimulationMetrics import SimulationMetrics
+from StepKernel import StepKernel
+
+def make_simulation(config_path, kernel, method):
+    if kernel == "numba":
+        pytest.importorskip("numba")
+
+    return DistrictSimulation(config_path, WEATHER_PATH, method=method, dt_seconds=900, kernel=kernel)
+
+
+@pytest.mark.parametrize("method", ["euler", "crank_nicolson"])
+@pytest.mark.parametrize("kernel", ["numpy", "numba"])
+def test_kernel_run_step_matches_plain_path(generated_config, kernel, method):
+    simulation = make_simulation(generated_config, kernel, method)
+    reference = make_simulation(generated_config, None, method)
+
+    assert simulation.kernel.backend == kernel
+
+    for _ in range(48):
+        result = simulation.run_step(900, compact=True)
+        expected = reference.run_step(900, compact=True)
+
+        np.testing.assert_allclose(result["room_temps"], expected["room_temps"], rtol=0, atol=1e-9)
+
+
+def test_kernel_sparse_exponential_matches_plain_path(generated_config):
+    simulation = make_simulation(generated_config, "numpy", "exponential")
+    reference = make_simulation(generated_config, None, "exponential")
+    simulation.thermal_solver.DENSE_EXPONENTIAL_LIMIT = 0
+
+    result = simulation.run(8, 900)
+    expected = reference.run(8, 900)
+
+    np.testing.assert_allclose(result["room_temps"].to_numpy(), expected["room_temps"].to_numpy(), rtol=0,
+                               atol=1e-8)
+
+
+@pytest.mark.parametrize("kernel", ["numpy", "numba"])
+def test_kernel_run_matches_plain_path(generated_config, kernel):
+    simulation = make_simulation(generated_config, kernel, "euler")
+    reference = make_simulation(generated_config, None, "euler")
+
+    result = simulation.run(96, 900)
+    expected = reference.run(96, 900)
+
+    np.testing.assert_allclose(result["room_temps"].to_numpy(), expected["room_temps"].to_numpy(), rtol=0,
+                               atol=1e-9)
+
+
+def test_auto_backend_uses_numpy_for_large_networks(generated_config, monkeypatch):
+    pytest.importorskip("numba")
+
+    assert make_simulation(generated_config, "auto", "euler").kernel.backend == "numba"
+
+    monkeypatch.setattr(StepKernel, "AUTO_NUMBA_MAX_NODES", 100)
+    assert make_simulation(generated_config, "auto", "euler").kernel.backend == "numpy"
+
+
+def test_public_sparse_product_fallback(generated_config, monkeypatch):
+    reference = make_simulation(generated_config, None, "crank_nicolson")
+
+    monkeypatch.setattr(StepKernel_module, "csr_matvec", None)
+    simulation = make_simulation(generated_config, "numpy", "crank_nicolson")
+
+    for _ in range(24):
+        np.testing.assert_allclose(simulation.run_step(900, compact=True)["room_temps"],
+                                   reference.run_step(900, compact=True)["room_temps"], rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("kernel, stage", [("numpy", "gains"), ("numba", "gains_solve")])
+def test_kernel_gains_are_timed(generated_config, kernel, stage):
+    if kernel == "numba":
+        pytest.importorskip("numba")
+
+    simulation = DistrictSimulation(generated_config, WEATHER_PATH, dt_seconds=900, kernel=kernel,
+                                    metrics=SimulationMetrics())
+
+    simulation.run_step(900)
+    simulation.run(10, 900)
+
+    assert simulation.metrics.stage_seconds[stage] > 0.0
+    assert all(seconds >= 0.0 for seconds in simulation.metrics.stage_seconds.values())
@@ -0,0 +1,66 @@
+﻿from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from TelemetryEncoder import TelemetryDecoder, TelemetryEncoder
+
+ROOM_IDS = [f"B{i // 10}:R{i % 10}" for i in range(50)]
+WEATHER = {"temperature": 4.5, "wind_speed": 3.0, "wind_direction": 200.0, "sun_radiation": 120.0,
+           "sun_altitude": 18.0, "sun_azimuth": 170.0}
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def make_result(step, temperatures):
+    return {
+        "timestamp": (START + timedelta(minutes=15 * step)).isoformat(),
+        "room_temps": temperatures,
+        "weather": WEATHER
+    }
+
+
+def test_keyframes_round_trip():
+    rng = np.random.default_rng(0)
+    encoder = TelemetryEncoder(ROOM_IDS)
+    decoder = TelemetryDecoder(encoder.schema_message())
+
+    for step in range(5):
+        temperatures = rng.uniform(15.0, 25.0, len(ROOM_IDS))
+        decoded = decoder.decode(encoder.encode(make_result(step, temperatures), 60.0))
+
+        assert decoded["sequence"] == step
+        assert decoded["timestamp_ms"] == int((START + timedelta(minutes=15 * step)).timestamp() * 1000)
+        assert decoded["speed_factor"] == 60.0
+        assert decoded["weather"] == pytest.approx(WEATHER)
+        np.testing.assert_array_equal(decoded["room_temps"], temperatures.astype(np.float32))
+
+
+def test_delta_frames_track_within_threshold():
+    rng = np.random.default_rng(1)
+    encoder = TelemetryEncoder(ROOM_IDS, delta_threshold=0.05, keyframe_interval=10)
+    decoder = TelemetryDecoder(encoder.schema_message())
+    temperatures = rng.uniform(15.0, 25.0, len(ROOM_IDS))
+    sizes = []
+
+    for step in range(25):
+        temperatures = temperatures + rng.normal(0.0, 0.03, len(ROOM_IDS))
+        frame = encoder.encode(make_result(step, temperatures), 1.0)
+        decoded = decoder.decode(frame)
+        sizes.append(len(frame))
+
+        assert np.all(np.abs(decoded["room_temps"] - temperatures) <= 0.05 + 1e-5)
+
+        if step % 10 == 0:
+            np.testing.assert_array_equal(decoded["room_temps"], temperatures.astype(np.float32))
+
+    # Delta frames only carry the rooms that moved past the threshold since they were last sent.
+    assert max(sizes[1:10]) < sizes[0]
+
+
+def test_decoder_rejects_foreign_frames():
+    encoder = TelemetryEncoder(ROOM_IDS)
+    decoder = TelemetryDecoder(encoder.schema_message())
+    frame = encoder.encode(make_result(0, np.zeros(len(ROOM_IDS))), 1.0)
+
+    with pytest.raises(ValueError):
+        decoder.decode(b"XXXX" + frame[4:])
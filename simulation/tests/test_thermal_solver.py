@@ -0,0 +1,86 @@
+﻿import numpy as np
+import pytest
+
+from ThermalSolver import ThermalSolver
+
+T_GROUND = 8.5
+
+
+def make_solver(model, method="euler"):
+    return ThermalSolver(model.G, model.C, model.G_ext_air, model.G_ext_ground, T_GROUND, method=method)
+
+
+def dense_euler_step(model, T, dt, T_outside, Q_extra):
+    # The original dense formulation the sparse Laplacian replaced.
+    G = model.G.toarray()
+
+    Q_inter = np.dot(G, T) - np.sum(G, axis=1) * T
+    Q_air = model.G_ext_air * (T_outside - T)
+    Q_ground = model.G_ext_ground * (T_GROUND - T)
+
+    return T + (Q_inter + Q_air + Q_ground + Q_extra) / model.C * dt
+
+
+def test_sparse_euler_matches_dense_reference(generated_model):
+    solver = make_solver(generated_model)
+    rng = np.random.default_rng(0)
+
+    solver.T[:] = rng.uniform(15.0, 25.0, len(solver.T))
+    T = solver.T.copy()
+
+    for _ in range(50):
+        T_outside = rng.uniform(-10.0, 10.0)
+        Q_extra = rng.uniform(0.0, 500.0, len(T))
+
+        T = dense_euler_step(generated_model, T, 30.0, T_outside, Q_extra)
+        solver.step(30.0, T_outside, Q_extra)
+
+    np.testing.assert_allclose(solver.T, T, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("method, dt, atol", [
+    ("euler", 10.0, 1e-3),
+    ("backward_euler", 900.0, 0.02),
+    ("crank_nicolson", 900.0, 1e-4)
+])
+def test_integrators_match_exponential_reference(generated_model, method, dt, atol):
+    reference = make_solver(generated_model, "exponential")
+    solver = make_solver(generated_model, method)
+    Q_extra = np.full(len(solver.T), 200.0)
+
+    # Exponential stepping is exact for inputs held over a step, one reference step per hour of the other method.
+    for hour in range(24):
+        T_outside = 5.0 * np.sin(hour / 24.0 * 2.0 * np.pi)
+        reference.step(3600.0, T_outside, Q_extra)
+
+        for _ in range(int(3600.0 / dt)):
+            solver.step(dt, T_outside, Q_extra)
+
+    np.testing.assert_allclose(solver.T, reference.T, rtol=0, atol=atol)
+
+
+def test_exponential_reaches_steady_state(generated_model):
+    solver = make_solver(generated_model, "exponential")
+    Q_extra = np.full(len(solver.T), 100.0)
+
+    for _ in range(200):
+        solver.step(30 * 86400.0, -5.0, Q_extra)
+
+    expected = make_solver(generated_model).steady_state(-5.0, Q_extra)
+
+    np.testing.assert_allclose(solver.T, expected, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("members", [None, 3])
+def test_sparse_exponential_matches_dense_propagator(generated_model, members):
+    dense, sparse_solver = [ThermalSolver(generated_model.G, generated_model.C, generated_model.G_ext_air,
+                                          generated_model.G_ext_ground, T_GROUND, method="exponential",
+                                          members=members) for _ in range(2)]
+    sparse_solver.DENSE_EXPONENTIAL_LIMIT = 0
+    Q_extra = np.random.default_rng(2).uniform(0.0, 500.0, dense.T.shape)
+
+    for hour in range(12):
+        dense.step(3600.0, -hour, Q_extra)
+        sparse_solver.step(3600.0, -hour, Q_extra)
+
+    np.testing.assert_allclose(sparse_solver.T, dense.T, rtol=0, atol=1e-8)
@@ -0,0 +1,130 @@
+﻿import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import WEATHER_PATH
+from WeatherService import WeatherService
+from WeatherStore import WeatherStore
+
+TIMEZONE = "Europe/Warsaw"
+LATITUDE = 52.445212
+LONGITUDE = 16.952679
+
+
+def make_service(path=WEATHER_PATH):
+    return WeatherService(path, TIMEZONE, LATITUDE, LONGITUDE)
+
+
+@pytest.fixture(scope="module")
+def service():
+    service = make_service()
+    start = pd.Timestamp("2024-03-01 00:00:00").tz_localize(TIMEZONE)
+    service.precompute(start, start + pd.Timedelta(days=2), 900)
+
+    return service
+
+
+def test_precomputed_table_matches_point_lookup(service):
+    assert service.table_length == 2 * 96
+
+    for step_index in (0, 1, 37, 50, 191):
+        current_time = service.table_start + pd.Timedelta(seconds=step_index * 900)
+        expected = service.get_weather(current_time)
+        row = service.get_weather_at(step_index)
+
+        assert row.keys() == expected.keys()
+        for name, value in expected.items():
+            assert row[name] == pytest.approx(value, abs=1e-9), name
+
+
+def test_index_of_only_accepts_table_steps(service):
+    assert service.index_of(service.table_start) == 0
+    assert service.index_of(service.table_start + pd.Timedelta(minutes=45)) == 3
+    assert service.index_of(service.table_start + pd.Timedelta(minutes=10)) is None
+    assert service.index_of(service.table_start - pd.Timedelta(minutes=15)) is None
+    assert service.index_of(service.table_start + pd.Timedelta(days=2)) is None
+
+
+def test_store_round_trip_matches_csv(tmp_path):
+    store_path = str(tmp_path / "weather.wst")
+    WeatherStore.convert_csv(WEATHER_PATH, store_path, dtype="float64")
+
+    csv = pd.read_csv(WEATHER_PATH)
+    store = WeatherStore(store_path)
+
+    assert store.length == len(csv)
+    assert isinstance(store["temperature"], np.memmap)
+    timestamps = pd.DatetimeIndex(pd.to_datetime(csv["timestamp"], utc=True)).as_unit("s").asi8
+    np.testing.assert_array_equal(store["timestamp"], timestamps)
+    for name in ("temperature", "wind_speed", "wind_direction", "sun_radiation"):
+        np.testing.assert_array_equal(store[name], csv[name].to_numpy(dtype=np.float64))
+
+
+def test_service_reads_store_like_csv(tmp_path):
+    store_path = str(tmp_path / "weather.wst")
+    WeatherStore.convert_csv(WEATHER_PATH, store_path)
+
+    from_csv = make_service()
+    from_store = make_service(store_path)
+    current_time = pd.Timestamp("2024-07-14 13:20:00").tz_localize(TIMEZONE)
+
+    expected = from_csv.get_weather(current_time)
+    weather = from_store.get_weather(current_time)
+
+    for name, value in expected.items():
+        assert weather[name] == pytest.approx(value, rel=1e-5, abs=1e-3), name
+
+
+def test_store_rejects_other_files(tmp_path):
+    with pytest.raises(ValueError):
+        WeatherStore(WEATHER_PATH)
+
+    with pytest.raises(ValueError):
+        WeatherStore.write(str(tmp_path / "uneven.wst"), {"a": np.zeros(3), "b": np.zeros(4)})
+
+
+def test_forecast_from_table_matches_computed_forecast(service):
+    start = service.table_start + pd.Timedelta(hours=6)
+
+    from_table = service.get_forecast(start, 48, 900)
+    computed = make_service().get_forecast(start, 48, 900)
+
+    assert from_table.keys() == computed.keys()
+    for name, values in computed.items():
+        assert len(from_table[name]) == 48
+        np.testing.assert_allclose(from_table[name], values, rtol=0, atol=1e-9)
+
+    # The forecast is a copy, perturbing it must leave the table intact.
+    from_table["temperature"] += 100.0
+    assert service.table["temperature"].max() < 100.0
+
+
+def test_forecast_beyond_table_is_computed(service):
+    start = service.table_start + pd.Timedelta(days=2) - pd.Timedelta(hours=1)
+    forecast = service.get_forecast(start, 8, 900)
+
+    assert len(forecast["temperature"]) == 8
+    assert forecast["temperature"][0] == pytest.approx(service.get_weather(start)["temperature"])
+
+
+def test_forecast_error_grows_with_lead_time(service):
+    start = service.table_start
+    exact = service.get_forecast(start, 96, 900)
+    error_std = {"temperature": 0.5, "wind_speed": 0.1, "sun_radiation": 0.1}
+
+    spreads = np.array([
+        service.get_forecast(start, 96, 900, error_std, np.random.default_rng(seed))["temperature"]
+        - exact["temperature"]
+        for seed in range(200)
+    ]).std(axis=0)
+
+    assert spreads[0] < spreads[-1]
+    assert spreads[-1] == pytest.approx(0.5 * np.sqrt(24.0), rel=0.2)
+
+    first = service.get_forecast(start, 96, 900, error_std, np.random.default_rng(7))
+    second = service.get_forecast(start, 96, 900, error_std, np.random.default_rng(7))
+    np.testing.assert_array_equal(first["wind_speed"], second["wind_speed"])
+    assert np.all(first["sun_radiation"] >= 0.0)
+
+    with pytest.raises(KeyError):
+        service.get_forecast(start, 4, 900, {"wind_direction": 1.0})